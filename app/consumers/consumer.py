@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.core.metrics import SQS_MESSAGES, SQS_OPERATION_DURATION
+
+# SQS caps receive_message and every *_batch call at 10 entries
+SQS_BATCH_LIMIT = 10
+
+
+def chunked(items: List, size: int = SQS_BATCH_LIMIT):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class QueueConsumer:
+    """Long-polls one SQS queue and hands messages to a bounded worker pool.
+
+    At most ``max_in_flight`` messages are being processed at any time; the
+    receive loop only asks SQS for as many messages as there are free slots,
+    so a slow handler slows down receiving instead of piling up work.
+    Successfully handled messages are deleted with ``delete_message_batch``.
+    A heartbeat thread extends the visibility timeout of messages that are
+    still being processed. Failed messages are left alone so SQS redelivers
+    them once their visibility timeout expires.
+    """
+
+    def __init__(
+        self,
+        sqs,
+        queue_url: str,
+        handler: Callable[[Dict], None],
+        max_workers: int = 4,
+        max_in_flight: Optional[int] = None,
+        max_messages: int = SQS_BATCH_LIMIT,
+        wait_time_seconds: int = 20,
+        visibility_timeout: int = 60,
+        name: Optional[str] = None,
+    ):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.handler = handler
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or max_workers
+        self.max_messages = min(max_messages, SQS_BATCH_LIMIT)
+        self.wait_time_seconds = wait_time_seconds
+        self.visibility_timeout = visibility_timeout
+        self.name = name or queue_url.rsplit("/", 1)[-1]
+
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix=f"sqs-{self.name}")
+        self._stop = threading.Event()
+        self._capacity = threading.Condition()
+        # ReceiptHandle -> monotonic deadline of the current visibility timeout
+        self._in_flight: Dict[str, float] = {}
+        self._pending_deletes: List[str] = []
+        self._deletes_lock = threading.Lock()
+        self._receiver = threading.Thread(target=self.run, name=f"sqs-{self.name}-receive", daemon=True)
+        self._heartbeater = threading.Thread(target=self._heartbeat, name=f"sqs-{self.name}-heartbeat", daemon=True)
+
+        self.processed = 0
+        self.failed = 0
+
+    # Lifecycle
+
+    def start(self) -> None:
+        self._receiver.start()
+        self._heartbeater.start()
+
+    def stop(self) -> None:
+        """Stop receiving. In-flight messages are finished and deleted by ``run``."""
+        self._stop.set()
+        with self._capacity:
+            self._capacity.notify_all()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._receiver.join(timeout)
+        self._heartbeater.join(timeout)
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    # Receive loop
+
+    def run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                free = self._wait_for_capacity()
+                if not free:
+                    continue
+                self.flush_deletes()
+                for message in self._receive(min(self.max_messages, free)):
+                    self._submit(message)
+        finally:
+            self._executor.shutdown(wait=True)
+            self.flush_deletes()
+            logging.info(f"Consumer {self.name} stopped: {self.processed} processed, {self.failed} failed")
+
+    def _wait_for_capacity(self) -> int:
+        with self._capacity:
+            while len(self._in_flight) >= self.max_in_flight and not self._stop.is_set():
+                self._capacity.wait()
+            if self._stop.is_set():
+                return 0
+            return self.max_in_flight - len(self._in_flight)
+
+    def _receive(self, max_messages: int) -> List[Dict]:
+        try:
+            # Includes the long-poll wait: an idle queue shows up as receives of WaitTimeSeconds
+            with SQS_OPERATION_DURATION.labels(self.name, "receive").time():
+                response = self.sqs.receive_message(
+                    QueueUrl=self.queue_url,
+                    MaxNumberOfMessages=max_messages,
+                    WaitTimeSeconds=self.wait_time_seconds,
+                    VisibilityTimeout=self.visibility_timeout,
+                )
+        except Exception as e:
+            logging.error(f"Consumer {self.name} could not receive messages: {e}")
+            self._stop.wait(1)
+            return []
+        messages = response.get("Messages", [])
+        SQS_MESSAGES.labels(self.name, "received").inc(len(messages))
+        return messages
+
+    def _submit(self, message: Dict) -> None:
+        receipt_handle = message["ReceiptHandle"]
+        with self._capacity:
+            self._in_flight[receipt_handle] = time.monotonic() + self.visibility_timeout
+        self._executor.submit(self._handle, message)
+
+    def _handle(self, message: Dict) -> None:
+        receipt_handle = message["ReceiptHandle"]
+        start = time.perf_counter()
+        try:
+            self.handler(message)
+        except Exception:
+            self.failed += 1
+            SQS_MESSAGES.labels(self.name, "failed").inc()
+            logging.exception(f"Consumer {self.name} failed to process message {message.get('MessageId')}")
+        else:
+            self.processed += 1
+            SQS_MESSAGES.labels(self.name, "processed").inc()
+            with self._deletes_lock:
+                self._pending_deletes.append(receipt_handle)
+                full = len(self._pending_deletes) >= SQS_BATCH_LIMIT
+            if full:
+                self.flush_deletes()
+        finally:
+            SQS_OPERATION_DURATION.labels(self.name, "process").observe(time.perf_counter() - start)
+            with self._capacity:
+                self._in_flight.pop(receipt_handle, None)
+                self._capacity.notify()
+
+    # Batched SQS calls
+
+    def flush_deletes(self) -> None:
+        with self._deletes_lock:
+            pending, self._pending_deletes = self._pending_deletes, []
+        for batch in chunked(pending):
+            entries = [{"Id": str(i), "ReceiptHandle": handle} for i, handle in enumerate(batch)]
+            try:
+                with SQS_OPERATION_DURATION.labels(self.name, "delete").time():
+                    response = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            except Exception as e:
+                logging.error(f"Consumer {self.name} could not delete {len(entries)} messages: {e}")
+                continue
+            failed = response.get("Failed", [])
+            SQS_MESSAGES.labels(self.name, "deleted").inc(len(entries) - len(failed))
+            for failure in failed:
+                logging.error(f"Consumer {self.name} could not delete message: {failure}")
+
+    def extend_visibility(self) -> None:
+        now = time.monotonic()
+        with self._capacity:
+            expiring = [
+                handle for handle, deadline in self._in_flight.items()
+                if deadline - now < self.visibility_timeout / 2
+            ]
+            for handle in expiring:
+                self._in_flight[handle] = now + self.visibility_timeout
+        for batch in chunked(expiring):
+            entries = [
+                {"Id": str(i), "ReceiptHandle": handle, "VisibilityTimeout": self.visibility_timeout}
+                for i, handle in enumerate(batch)
+            ]
+            try:
+                self.sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+            except Exception as e:
+                logging.error(f"Consumer {self.name} could not extend visibility of {len(entries)} messages: {e}")
+
+    def _heartbeat(self) -> None:
+        interval = max(self.visibility_timeout / 4, 0.05)
+        while not self._stop.wait(interval):
+            self.extend_visibility()
+            self.flush_deletes()
+        # Keep extending until the receive loop has drained the pool
+        while self._receiver.is_alive():
+            self.extend_visibility()
+            self._receiver.join(interval)
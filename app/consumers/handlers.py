@@ -0,0 +1,102 @@
+import json
+import logging
+from typing import Dict, List, Optional
+
+from app.consumers import ledger, outbox
+from app.consumers.producer import build_grading_entries
+from app.core.config import settings
+from app.core.presign import presigned_url
+from app.crud import crud_application
+from app.db.session import WorkerSessionLocal
+from app.schemas import schemas
+
+def build_grading_applications(rows, documents):
+    # Generator: the producer serializes applications one at a time
+    for row in rows:
+        app_dict = dict(row)
+        # Remove unwanted attributes and add documents
+        app_dict.pop("status")
+        app_dict["created_at"] = app_dict["created_at"].isoformat()
+        # Graders get links that stay valid for the whole evaluation
+        app_dict["documents"] = [
+            {**document, "file_path": presigned_url(document["file_path"], settings.GRADING_PRESIGNED_URL_TTL)}
+            for document in documents.get(row["id"], [])
+        ]
+        yield app_dict
+
+def parse_deadline_notification(notification: dict) -> Dict:
+    # Header repeated in every grading chunk
+    return {
+        "scholarship_id": notification["scholarship_id"],
+        "jury_ids": notification["jury_ids"],
+        "spots": notification["spots"],
+        "closed_at": notification["closed_at"]
+    }
+
+def apply_deadline(db, key: str, message_id: Optional[str], header: Dict) -> Optional[int]:
+    """Claim the message, move the scholarship's submitted applications to evaluation and put the
+    grading payload in the outbox, all in one commit. Returns the number of applications moved,
+    or None if the message was already processed."""
+    if not ledger.claim(db, key, message_id):
+        return None
+    rows = crud_application.bulk_update_status(
+        db,
+        header["scholarship_id"],
+        schemas.ApplicationStatus.submitted,
+        schemas.ApplicationStatus.under_evaluation,
+        commit=False,
+    )
+    documents = crud_application.get_documents_by_application_ids(db, [row["id"] for row in rows])
+    queue_url = settings.TO_GRADING_QUEUE_URL
+    entries = build_grading_entries(header, build_grading_applications(rows, documents), queue_url, ledger.dispatch_id(key))
+    outbox.enqueue(db, queue_url, entries)
+    # The moved applications' cache entries are invalidated on commit, before their events go out
+    db.commit()
+    return len(rows)
+
+def process_message(message):
+    body = message['Body']
+    header = parse_deadline_notification(json.loads(body))
+    with WorkerSessionLocal() as db:
+        # One transaction; the outbox relay sends the payload to grading
+        moved = apply_deadline(db, ledger.message_key("deadline", body), message.get("MessageId"), header)
+    if moved is None:
+        logging.info(f"Deadline of scholarship {header['scholarship_id']} already processed, skipping")
+    else:
+        logging.info(f"{moved} applications of scholarship {header['scholarship_id']} under evaluation")
+
+def parse_grading_results(notification: dict) -> List[Dict]:
+    results = []
+    for application in notification["applications"]:
+        #### THE WINNER MUST HAVE FLAG SELECTED SET TO TRUE
+        accepted = application['status'] == "Accepted"
+        results.append({
+            "id": application['application_id'],
+            "status": schemas.ApplicationStatus.approved if accepted else schemas.ApplicationStatus.rejected,
+            "select": accepted,
+            "grade": application['grade'],
+            "reason": application['reason'],
+        })
+    return results
+
+def process_message2(message):
+    body = message['Body']
+    results = parse_grading_results(json.loads(body))
+    key = ledger.message_key("grading-results", body)
+    with WorkerSessionLocal() as db:
+        # No side effects outside the database: the claim is committed with the results
+        if not ledger.claim(db, key, message.get("MessageId")):
+            logging.info(f"Grading results {key} already applied, skipping")
+            return
+        updated = crud_application.apply_grading_results(db, results)
+        # apply_grading_results doesn't commit an empty message; the claim still has to be
+        db.commit()
+    logging.info(f"Applied {len(results)} grading results, {updated} applications updated")
+
+# Queue URL -> handler for every configured queue this service consumes
+def get_queue_handlers():
+    handlers = {
+        settings.DEADLINE_QUEUE_URL: process_message,
+        settings.APP_GRADING_QUEUE_URL: process_message2,
+    }
+    return {url: handler for url, handler in handlers.items() if url and url != "None"}
@@ -0,0 +1,48 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import models
+
+
+def message_key(handler: str, body: str) -> str:
+    # Keyed by content rather than MessageId: a redelivery and a second send of the same
+    # notification (e.g. by an overlapping scheduler) both map to the same key
+    return f"{handler}:{hashlib.sha256(body.encode()).hexdigest()}"
+
+
+def dispatch_id(key: str) -> str:
+    # Derived from the message, so duplicate dispatches share their FIFO deduplication ids
+    return key.rsplit(":", 1)[-1][:32]
+
+
+def claim(db: Session, key: str, message_id: Optional[str]) -> bool:
+    """Add the ledger row to the current transaction; the caller's commit makes the claim and its
+    changes visible together. Returns False, with the session rolled back, if the key is already
+    claimed. Call it before any other change in the transaction."""
+    db.add(models.ProcessedMessage(key=key, message_id=message_id))
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def purge(db: Session, retention_days: float, batch_size: int = 1000) -> int:
+    """Delete ledger rows older than ``retention_days``, in batches of one commit each; returns how many.
+    created_at comes from the database clock, which is expected to be UTC."""
+    table = models.ProcessedMessage.__table__
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    purged = 0
+    while True:
+        keys = db.execute(select(table.c.key).where(table.c.created_at < cutoff).limit(batch_size)).scalars().all()
+        if not keys:
+            return purged
+        db.execute(delete(table).where(table.c.key.in_(keys)))
+        db.commit()
+        purged += len(keys)
@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.orm import Session
+
+from app.consumers import ledger
+from app.consumers.producer import batch_entries
+from app.core.aws import get_sqs_client
+from app.core.config import settings
+from app.core.metrics import SQS_MESSAGES, SQS_OPERATION_DURATION
+from app.models import models
+
+
+def enqueue(db: Session, queue_url: str, entries: List[Dict]) -> None:
+    """Add send_message_batch entries to the outbox in the caller's transaction; nothing is sent until it commits."""
+    now = time.time()
+    db.add_all(
+        models.OutboxMessage(
+            queue_url=queue_url,
+            body=entry["MessageBody"],
+            attributes=json.dumps(entry["MessageAttributes"]) if entry.get("MessageAttributes") else None,
+            group_id=entry.get("MessageGroupId"),
+            deduplication_id=entry.get("MessageDeduplicationId"),
+            available_at=now,
+        )
+        for entry in entries
+    )
+
+
+def to_entry(row) -> Dict:
+    # The row id doubles as the batch entry Id, to match SQS' per-entry results back to rows
+    entry = {"Id": str(row["id"]), "MessageBody": row["body"]}
+    if row["attributes"]:
+        entry["MessageAttributes"] = json.loads(row["attributes"])
+    if row["group_id"]:
+        entry["MessageGroupId"] = row["group_id"]
+    if row["deduplication_id"]:
+        entry["MessageDeduplicationId"] = row["deduplication_id"]
+    return entry
+
+
+def backoff(attempts: int) -> float:
+    return min(settings.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), settings.OUTBOX_BACKOFF_MAX)
+
+
+class OutboxRelay:
+    """Drains the outbox to SQS in the background.
+
+    Each poll takes up to ``batch_size`` due rows (``FOR UPDATE SKIP LOCKED`` on Postgres, so
+    several relays can run), sends them with ``send_message_batch`` grouped per queue, deletes
+    the rows that were accepted and pushes the others back with an exponential backoff.
+    Delivery is at least once: a crash between the send and the commit sends those rows again.
+    With ``retention_days``, it also purges older rows from the processed message ledger every
+    ``purge_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        sqs=None,
+        batch_size: int = 100,
+        poll_interval: float = 1,
+        name: str = "outbox",
+        retention_days: float = 0,
+        purge_interval: float = 3600,
+    ):
+        self.session_factory = session_factory
+        self.sqs = sqs
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.name = name
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name=f"{name}-relay", daemon=True)
+        self.sent = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                sent = self.run_once()
+            except Exception:
+                logging.exception(f"Relay {self.name} failed to drain the outbox")
+                sent = 0
+            self.purge_ledger()
+            # A full batch means there is probably more waiting
+            if sent < self.batch_size:
+                self._stop.wait(self.poll_interval)
+        logging.info(f"Relay {self.name} stopped: {self.sent} sent, {self.failed} send failures")
+
+    def run_once(self) -> int:
+        """Send one batch of due rows; returns how many SQS accepted."""
+        table = models.OutboxMessage.__table__
+        now = time.time()
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(table)
+                .where(table.c.available_at <= now)
+                .order_by(table.c.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).mappings().all()
+            if not rows:
+                return 0
+
+            by_queue: Dict[str, List] = defaultdict(list)
+            for row in rows:
+                by_queue[row["queue_url"]].append(row)
+            sent_ids = set()
+            for queue_url, queue_rows in by_queue.items():
+                sent_ids.update(self._send(queue_url, [to_entry(row) for row in queue_rows]))
+
+            failed = [row for row in rows if row["id"] not in sent_ids]
+            if sent_ids:
+                db.execute(delete(table).where(table.c.id.in_(sent_ids)))
+            if failed:
+                db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("b_id"))
+                    .values(attempts=bindparam("b_attempts"), available_at=bindparam("b_available_at")),
+                    [
+                        {"b_id": row["id"], "b_attempts": row["attempts"] + 1, "b_available_at": now + backoff(row["attempts"] + 1)}
+                        for row in failed
+                    ],
+                )
+            db.commit()
+
+        self.sent += len(sent_ids)
+        self.failed += len(failed)
+        if failed:
+            logging.warning(f"Relay {self.name}: {len(failed)} outbox messages not sent, retrying with backoff")
+        return len(sent_ids)
+
+    def purge_ledger(self) -> int:
+        """Delete expired ledger rows if a purge is due; returns how many."""
+        if self.retention_days <= 0 or time.monotonic() < self._next_purge:
+            return 0
+        self._next_purge = time.monotonic() + self.purge_interval
+        try:
+            with self.session_factory() as db:
+                purged = ledger.purge(db, self.retention_days)
+        except Exception:
+            logging.exception(f"Relay {self.name} failed to purge the processed message ledger")
+            return 0
+        if purged:
+            logging.info(f"Relay {self.name} purged {purged} processed messages older than {self.retention_days:g} days")
+        return purged
+
+    def _send(self, queue_url: str, entries: List[Dict]) -> List[int]:
+        sqs = self.sqs or get_sqs_client()
+        queue = queue_url.rsplit("/", 1)[-1]
+        sent = []
+        for batch in batch_entries(entries):
+            try:
+                with SQS_OPERATION_DURATION.labels(queue, "send").time():
+                    response = sqs.send_message_batch(QueueUrl=queue_url, Entries=batch)
+            except Exception as e:
+                logging.error(f"Relay {self.name} could not send {len(batch)} messages to {queue}: {e}")
+                continue
+            successful = response.get("Successful", [])
+            SQS_MESSAGES.labels(queue, "sent").inc(len(successful))
+            sent.extend(int(success["Id"]) for success in successful)
+            for failure in response.get("Failed", []):
+                logging.error(f"Relay {self.name} could not send message to {queue}: {failure}")
+        return sent
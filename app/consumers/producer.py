@@ -0,0 +1,122 @@
+import base64
+import gzip
+import json
+import logging
+from typing import Dict, Iterable, List
+
+from app.consumers.consumer import SQS_BATCH_LIMIT
+from app.core.aws import get_s3_client
+from app.core.config import settings
+
+# SQS limit for one message body, and for the sum of all bodies in one send_message_batch call
+SQS_MAX_MESSAGE_BYTES = 256 * 1024
+# Room kept for message attributes when sizing bodies against the SQS limits
+ATTRIBUTES_BYTES = 1024
+
+CONTENT_ENCODING_ATTRIBUTE = "content-encoding"
+
+
+def chunk_applications(applications: Iterable[Dict], max_bytes: int) -> List[List[str]]:
+    """Serialize applications one by one and group them into chunks of about ``max_bytes``.
+
+    An application bigger than ``max_bytes`` on its own becomes a single-application chunk;
+    ``encode_chunk`` then compresses it or offloads it to S3.
+    """
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for application in applications:
+        encoded = json.dumps(application)
+        if current and size + len(encoded) + 1 > max_bytes:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(encoded)
+        size += len(encoded) + 1
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_body(header: Dict, manifest: Dict, applications: List[str]) -> str:
+    # Applications are already JSON; splice them in instead of decoding and encoding again
+    envelope = json.dumps({"manifest": manifest, **header})
+    return envelope[:-1] + ', "applications": [' + ", ".join(applications) + "]}"
+
+
+def encode_chunk(body: str, manifest: Dict, max_bytes: int = SQS_MAX_MESSAGE_BYTES - ATTRIBUTES_BYTES) -> Dict:
+    """Build the send_message_batch entry for one chunk.
+
+    Bodies that fit are sent as is. Bigger ones are gzipped (base64, marked with a
+    content-encoding attribute). If that still doesn't fit the body is written to S3 and
+    the message carries only the manifest and a pointer to it (claim check).
+    """
+    attributes = {}
+    if len(body.encode()) > max_bytes:
+        compressed = base64.b64encode(gzip.compress(body.encode())).decode()
+        if len(compressed) <= max_bytes:
+            body = compressed
+            attributes[CONTENT_ENCODING_ATTRIBUTE] = {"DataType": "String", "StringValue": "gzip+base64"}
+        else:
+            key = f"{settings.GRADING_PAYLOAD_PREFIX}{manifest['dispatch_id']}/{manifest['chunk_index']}.json"
+            get_s3_client().put_object(Bucket=settings.S3_BUCKET_NAME, Key=key, Body=body.encode())
+            body = json.dumps({"manifest": manifest, "payload_location": {"bucket": settings.S3_BUCKET_NAME, "key": key}})
+    return {"MessageBody": body, "MessageAttributes": attributes}
+
+
+def decode_chunk(message: Dict) -> Dict:
+    """Inverse of encode_chunk, for the receiving side and tests."""
+    body = message["Body"]
+    attribute = message.get("MessageAttributes", {}).get(CONTENT_ENCODING_ATTRIBUTE)
+    if attribute and attribute["StringValue"] == "gzip+base64":
+        body = gzip.decompress(base64.b64decode(body)).decode()
+    payload = json.loads(body)
+    if "payload_location" in payload:
+        location = payload["payload_location"]
+        obj = get_s3_client().get_object(Bucket=location["bucket"], Key=location["key"])
+        payload = json.loads(obj["Body"].read())
+    return payload
+
+
+def batch_entries(entries: List[Dict]) -> Iterable[List[Dict]]:
+    # At most 10 entries and 256KB of bodies per send_message_batch call
+    batch: List[Dict] = []
+    size = 0
+    for entry in entries:
+        entry_size = len(entry["MessageBody"].encode()) + ATTRIBUTES_BYTES
+        if batch and (len(batch) == SQS_BATCH_LIMIT or size + entry_size > SQS_MAX_MESSAGE_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(entry)
+        size += entry_size
+    if batch:
+        yield batch
+
+
+def build_grading_entries(header: Dict, applications: Iterable[Dict], queue_url: str, dispatch_id: str) -> List[Dict]:
+    """Encode a scholarship's applications as send_message_batch entries (without ``Id``), one per chunk.
+
+    Every chunk repeats ``header`` (scholarship_id, jury_ids, spots, closed_at) and carries a
+    manifest with the dispatch id, its index and the total, so the grader can reassemble them.
+    """
+    fifo = queue_url.endswith(".fifo")
+    chunks = chunk_applications(applications, settings.GRADING_CHUNK_BYTES)
+    entries = []
+    for index, chunk in enumerate(chunks):
+        manifest = {
+            "dispatch_id": dispatch_id,
+            "scholarship_id": header["scholarship_id"],
+            "chunk_index": index,
+            "chunk_total": len(chunks),
+            "application_count": len(chunk),
+        }
+        entry = encode_chunk(chunk_body(header, manifest, chunk), manifest)
+        if fifo:
+            entry["MessageGroupId"] = str(header["scholarship_id"])
+            entry["MessageDeduplicationId"] = f"{dispatch_id}-{index}"
+        entries.append(entry)
+    logging.info(
+        f"Encoded scholarship {header['scholarship_id']} for grading: {sum(len(c) for c in chunks)} applications "
+        f"in {len(chunks)} chunks, {sum(len(e['MessageBody']) for e in entries)} bytes"
+    )
+    return entries
+
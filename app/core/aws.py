@@ -0,0 +1,32 @@
+import threading
+from typing import Any, Dict
+
+from app.core.config import settings
+
+# boto3 clients are created on first use and shared by every thread in the process.
+# Clients are thread-safe, but creating them through the default session is not.
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+def get_client(service_name: str):
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                # Imported here because boto3 is slow to import and most code paths never need it
+                import boto3
+                client = boto3.client(service_name, region_name=settings.REGION)
+                _clients[service_name] = client
+    return client
+
+def set_client(service_name: str, client) -> None:
+    # Replace a client, e.g. with a local stand-in in tests and benchmarks
+    with _lock:
+        _clients[service_name] = client
+
+def get_s3_client():
+    return get_client("s3")
+
+def get_sqs_client():
+    return get_client("sqs")
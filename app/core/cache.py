@@ -0,0 +1,190 @@
+import hashlib
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+from app.core.config import settings
+
+
+class MemoryBackend:
+    """In-process LRU with a TTL per entry."""
+
+    blocking = False
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Invalidation counters live outside the LRU: evicting one early would revive stale entries.
+        # key -> (version, monotonic time of the last incr), oldest first. Versions come from one
+        # sequence, so a counter dropped and bumped again never reuses a version still cached.
+        self._counters: "OrderedDict[str, tuple]" = OrderedDict()
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def get_counter(self, key: str) -> int:
+        entry = self._counters.get(key)
+        return entry[0] if entry else 0
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            now = time.monotonic()
+            # Entries stored under a counter's older versions, even by a load that raced with the
+            # bump, are gone two TTLs after it; then the counter can go back to 0
+            while self._counters:
+                oldest, (_, bumped_at) = next(iter(self._counters.items()))
+                if now - bumped_at <= 2 * self.ttl:
+                    break
+                del self._counters[oldest]
+            version = next(self._versions)
+            self._counters[key] = (version, now)
+            self._counters.move_to_end(key)
+            return version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisBackend:
+    """Shared cache for several API processes and the worker; needs the optional ``redis`` package."""
+
+    blocking = True
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._redis.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._redis.delete(*keys)
+
+    def get_counter(self, key: str) -> int:
+        return int(self._redis.get(key) or 0)
+
+    def incr(self, key: str) -> int:
+        return self._redis.incr(key)
+
+    def clear(self) -> None:
+        self._redis.flushdb()
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def etag(self) -> str:
+        return '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+
+    def encode(self) -> bytes:
+        return json.dumps(self.headers).encode() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, value: bytes) -> "CachedResponse":
+        headers, body = value.split(b"\n", 1)
+        return cls(body=body, headers=json.loads(headers))
+
+
+class ApplicationCache:
+    """Read-through cache of serialized application responses.
+
+    Keys embed a version that invalidation bumps: per application for details, per user for
+    listings, which also depend on paging parameters. Superseded entries are never read again
+    and age out, and a load that raced with an invalidation stores its body under the old key.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _details_version_key(self, application_id: int) -> str:
+        return f"applications:id:{application_id}:version"
+
+    def details_key(self, application_id: int) -> str:
+        version = self.backend.get_counter(self._details_version_key(application_id))
+        return f"applications:id:{application_id}:v{version}"
+
+    def _user_version_key(self, user_id: str) -> str:
+        return f"applications:user:{user_id}:version"
+
+    def listing_key(self, user_id: str, *params) -> str:
+        version = self.backend.get_counter(self._user_version_key(user_id))
+        digest = hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+        return f"applications:user:{user_id}:v{version}:{digest}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CachedResponse.decode(value)
+
+    def set(self, key: str, response: CachedResponse) -> None:
+        if self.ttl <= 0:
+            return
+        self.backend.set(key, response.encode(), self.ttl)
+
+    def invalidate(self, application_ids: Iterable[int] = (), user_ids: Iterable[str] = ()) -> None:
+        for application_id in set(application_ids):
+            self.backend.incr(self._details_version_key(application_id))
+        for user_id in set(user_ids):
+            self.backend.incr(self._user_version_key(user_id))
+
+    def clear(self) -> None:
+        self.backend.clear()
+        self.hits = self.misses = 0
+
+
+def build_backend():
+    if settings.CACHE_BACKEND == "redis":
+        return RedisBackend(settings.CACHE_REDIS_URL)
+    return MemoryBackend(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL)
+
+
+application_cache = ApplicationCache(build_backend(), settings.CACHE_TTL)
+
+
+def invalidate_applications(application_ids: Iterable[int] = (), user_ids: Iterable[str] = ()) -> None:
+    """Call after committing a change to applications or their documents."""
+    application_cache.invalidate(application_ids, user_ids)
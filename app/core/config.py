@@ -6,14 +6,86 @@ load_dotenv()
 class Settings:
     PROJECT_NAME: str = "Application Management Service"
     DATABASE_URL = str(os.getenv("DATABASE_URL", "sqlite:///todo.db"))
+    # Serve the read endpoints through an AsyncEngine (asyncpg / aiosqlite) instead of the threadpool
+    ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "false").lower() in ("1", "true", "yes")
+    ASYNC_DATABASE_URL = str(os.getenv("ASYNC_DATABASE_URL", ""))
+    MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+    # Applications accepted by one bulk submission
+    BULK_SUBMIT_MAX_ITEMS = int(os.getenv("BULK_SUBMIT_MAX_ITEMS", 1000))
+    # Connection pools: the API and the queue consumers get separate pools so a grading burst
+    # can't starve user requests. DB_STATEMENT_TIMEOUT_MS=0 disables the server-side timeout.
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+    WORKER_DB_POOL_SIZE = int(os.getenv("WORKER_DB_POOL_SIZE", 5))
+    WORKER_DB_MAX_OVERFLOW = int(os.getenv("WORKER_DB_MAX_OVERFLOW", 5))
+    # Read-through cache for application details and per-user listings: "memory" is per process,
+    # "redis" is shared with the other API workers and the queue consumer. Keep CACHE_TTL well
+    # under PRESIGNED_URL_TTL / 2, cached responses contain presigned document URLs.
+    CACHE_BACKEND = str(os.getenv("CACHE_BACKEND", "memory"))
+    CACHE_REDIS_URL = str(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    CACHE_TTL = float(os.getenv("CACHE_TTL", 30))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
     SECRET_KEY = str(os.getenv('SECRET_KEY', 'K%!MaoL26XQe8iGAAyDrmbkw&bqE$hCPw4hSk!Hf'))
     REGION = str(os.getenv('REGION'))
     USER_POOL_ID = str(os.getenv('USER_POOL_ID'))
     FRONTEND_URL = str(os.getenv('FRONTEND_URL'))
     S3_BUCKET_NAME = str(os.getenv("S3_BUCKET_NAME", "bolsua-storage-dev"))
+    # Documents are stored under {prefix}{scholarship_id}/{user_id}/{sha256}{extension}
+    DOCUMENT_KEY_PREFIX = str(os.getenv("DOCUMENT_KEY_PREFIX", "documents/"))
+    S3_UPLOAD_PART_SIZE = int(os.getenv("S3_UPLOAD_PART_SIZE", 8 * 1024 * 1024))
+    S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", 4))
+    S3_CHECK_CONCURRENCY = int(os.getenv("S3_CHECK_CONCURRENCY", 16))
+    # Document URLs are presigned when read; grading links must outlive the evaluation (SigV4 max is 7 days)
+    PRESIGNED_URL_TTL = int(os.getenv("PRESIGNED_URL_TTL", 3600))
+    GRADING_PRESIGNED_URL_TTL = int(os.getenv("GRADING_PRESIGNED_URL_TTL", 7 * 24 * 3600))
+    PRESIGNED_URL_CACHE_SIZE = int(os.getenv("PRESIGNED_URL_CACHE_SIZE", 50000))
+
+    # SQS queues and consumer tuning. Disable the in-API consumers when running app.worker
+    SQS_CONSUMERS_ENABLED = os.getenv("SQS_CONSUMERS_ENABLED", "true").lower() in ("1", "true", "yes")
+    DEADLINE_QUEUE_URL = str(os.getenv("DEADLINE_QUEUE_URL"))
+    TO_GRADING_QUEUE_URL = str(os.getenv("TO_GRADING_QUEUE_URL"))
+    APP_GRADING_QUEUE_URL = str(os.getenv("APP_GRADING_QUEUE_URL"))
+    SQS_MAX_MESSAGES = int(os.getenv("SQS_MAX_MESSAGES", 10))
+    SQS_WAIT_TIME_SECONDS = int(os.getenv("SQS_WAIT_TIME_SECONDS", 20))
+    SQS_VISIBILITY_TIMEOUT = int(os.getenv("SQS_VISIBILITY_TIMEOUT", 60))
+    SQS_WORKER_THREADS = int(os.getenv("SQS_WORKER_THREADS", 4))
+    # Received but unfinished messages per queue; at least SQS_MAX_MESSAGES so receives fill whole batches
+    SQS_MAX_IN_FLIGHT = int(os.getenv("SQS_MAX_IN_FLIGHT", 20))
+    # Grading payloads are split into chunks of about this many bytes; SQS caps a message, and a
+    # whole send_message_batch call, at 256KB, so the default lets 10 chunks share one call
+    GRADING_CHUNK_BYTES = int(os.getenv("GRADING_CHUNK_BYTES", 24 * 1024))
+    GRADING_PAYLOAD_PREFIX = str(os.getenv("GRADING_PAYLOAD_PREFIX", "grading-payloads/"))
+    # Outbox relay: rows per poll, idle poll interval and the retry backoff (doubling, capped)
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))
+    OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 1))
+    OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 300))
+    # The relay also deletes processedmessage rows older than this, every LEDGER_PURGE_INTERVAL
+    # seconds; 14 days is the longest SQS keeps a message, so no redelivery can outlive its row. 0 keeps them all.
+    LEDGER_RETENTION_DAYS = float(os.getenv("LEDGER_RETENTION_DAYS", 14))
+    LEDGER_PURGE_INTERVAL = float(os.getenv("LEDGER_PURGE_INTERVAL", 3600))
+
+    # Status change events for GET /applications/events: "memory" publishes in this process only,
+    # "postgres" uses LISTEN/NOTIFY so every API worker (and app.worker's changes) reach all clients
+    STATUS_EVENTS_BACKEND = str(os.getenv("STATUS_EVENTS_BACKEND", "memory"))
+    STATUS_EVENTS_HISTORY = int(os.getenv("STATUS_EVENTS_HISTORY", 10000))
+    STATUS_EVENTS_TIMEOUT = float(os.getenv("STATUS_EVENTS_TIMEOUT", 25))
+    STATUS_EVENTS_KEEPALIVE = float(os.getenv("STATUS_EVENTS_KEEPALIVE", 15))
 
     # AWS Cognito configuration
-    COGNITO_KEYS_URL = f'https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}/.well-known/jwks.json'
+    COGNITO_KEYS_URL = str(os.getenv(
+        'COGNITO_KEYS_URL',
+        f'https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}/.well-known/jwks.json'
+    ))
+    JWKS_CACHE_TTL = float(os.getenv('JWKS_CACHE_TTL', 3600))
+    JWKS_REFRESH_INTERVAL = float(os.getenv('JWKS_REFRESH_INTERVAL', 900))
+    JWKS_MIN_REFETCH_INTERVAL = float(os.getenv('JWKS_MIN_REFETCH_INTERVAL', 30))
+    TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', 60))
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
 
 
 settings = Settings()
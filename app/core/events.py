@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from select import select as wait_readable
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.core.cache import invalidate_applications
+from app.core.config import settings
+from app.models import models
+
+CHANNEL = "application_status"
+PENDING_KEY = "status_events"
+INVALIDATIONS_KEY = "cache_invalidations"
+
+
+class StatusEventBus:
+    """In-process pub/sub of application status changes, keyed by user.
+
+    Published events get a version ``"{epoch}:{sequence}"`` and are kept in a bounded history,
+    so a client passing the last version it saw gets what it missed. A version from another
+    process, or older than the history, can't be resumed from: the caller is told to ``reset``,
+    i.e. refetch the listing once. Waiting clients cost no DB queries; publish wakes them
+    from any thread.
+    """
+
+    def __init__(self, history: int = 1000):
+        self._history: deque = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, set] = {}
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+
+    def version(self) -> str:
+        return f"{self.epoch}:{self._sequence}"
+
+    def publish(self, status_event: Dict) -> None:
+        with self._lock:
+            self._sequence += 1
+            status_event = {**status_event, "version": self.version()}
+            self._history.append((self._sequence, status_event))
+            waiters = list(self._waiters.get(status_event["user_id"], ()))
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(waiter.set)
+
+    def reset(self) -> None:
+        # After events may have been lost (e.g. the LISTEN connection dropped): every client resyncs
+        with self._lock:
+            self._history.clear()
+            self.epoch = uuid.uuid4().hex[:8]
+            self._sequence = 0
+
+    def events_since(self, user_id: str, since: Optional[str]) -> Tuple[List[Dict], str, bool]:
+        """The user's events after ``since``, the version to resume from, and whether the client must resync."""
+        with self._lock:
+            current = self.version()
+            if since is None:
+                return [], current, False
+            epoch, _, sequence = since.partition(":")
+            oldest = self._history[0][0] if self._history else self._sequence + 1
+            if epoch != self.epoch or not sequence.isdigit() or int(sequence) < oldest - 1 or int(sequence) > self._sequence:
+                return [], current, True
+            after = int(sequence)
+            return [e for s, e in self._history if s > after and e["user_id"] == user_id], current, False
+
+    async def wait(self, user_id: str, since: Optional[str], timeout: float) -> Tuple[List[Dict], str, bool]:
+        """Long-poll: return as soon as the user has events after ``since``, or after ``timeout`` seconds.
+        Without ``since`` it returns the current version right away."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(user_id, set()).add(waiter)
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                # Registered before checking, so an event published in between still wakes us
+                waiter[1].clear()
+                events, version, reset = self.events_since(user_id, since)
+                remaining = deadline - time.monotonic()
+                if events or reset or since is None or remaining <= 0:
+                    return events, version, reset
+                # Nothing new yet: resume from the current version, not a stale one
+                since = version
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(user_id)
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[user_id]
+
+
+status_bus = StatusEventBus(history=settings.STATUS_EVENTS_HISTORY)
+
+
+def status_event(application_id: int, user_id: str, scholarship_id: int, status, select: bool) -> Dict:
+    return {
+        "application_id": application_id,
+        "user_id": user_id,
+        "scholarship_id": scholarship_id,
+        "status": models.ApplicationStatus(status).value,
+        "select": bool(select),
+    }
+
+
+def emit(db: Session, events: List[Dict]) -> None:
+    """Queue status events in the caller's transaction; they are published only if it commits.
+
+    With STATUS_EVENTS_BACKEND=postgres they go out through NOTIFY, which Postgres delivers on
+    commit to every API worker listening; otherwise they are published in this process. Either
+    way the cache entries of the applications are invalidated on commit, before publishing.
+    """
+    if not events:
+        return
+    invalidate_on_commit(db, [e["application_id"] for e in events], [e["user_id"] for e in events])
+    if settings.STATUS_EVENTS_BACKEND == "postgres":
+        db.execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {"channel": CHANNEL, "payloads": [json.dumps(e) for e in events]},
+        )
+        return
+    db.info.setdefault(PENDING_KEY, []).extend(events)
+
+
+def deliver(status_events: List[Dict], bus: StatusEventBus = status_bus, application_ids: Iterable[int] = (), user_ids: Iterable[str] = ()) -> None:
+    # The cached listings and details go first: a client refetching as soon as it sees an event
+    # must not be served the state from before the change
+    application_ids = {*application_ids, *(e["application_id"] for e in status_events)}
+    user_ids = {*user_ids, *(e["user_id"] for e in status_events)}
+    if application_ids or user_ids:
+        invalidate_applications(application_ids, user_ids)
+    for status_event in status_events:
+        bus.publish(status_event)
+
+
+def invalidate_on_commit(db: Session, application_ids: Iterable[int] = (), user_ids: Iterable[str] = ()) -> None:
+    """Invalidate the cached applications once the caller's transaction commits, ahead of its status events."""
+    pending_ids, pending_users = db.info.setdefault(INVALIDATIONS_KEY, (set(), set()))
+    pending_ids.update(application_ids)
+    pending_users.update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def publish_pending(session: Session) -> None:
+    application_ids, user_ids = session.info.pop(INVALIDATIONS_KEY, ((), ()))
+    deliver(session.info.pop(PENDING_KEY, []), application_ids=application_ids, user_ids=user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_pending(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
+    session.info.pop(INVALIDATIONS_KEY, None)
+
+
+class PostgresListener:
+    """LISTENs on the status channel in a background thread and republishes every notification on
+    the in-process bus, after invalidating this process's cache entries for it. The connection is
+    its own, outside the pools; after a reconnect the bus is reset, since notifications sent in
+    between are lost."""
+
+    def __init__(self, database_url: str, bus: StatusEventBus = status_bus, poll_interval: float = 5):
+        self.database_url = database_url
+        self.bus = bus
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name="status-events-listener", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    def run(self) -> None:
+        engine = create_engine(self.database_url, poolclass=NullPool)
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                self.listen(engine)
+                delay = 1.0
+            except Exception as e:
+                logging.error(f"Status events listener disconnected: {e}")
+                self._stop.wait(delay)
+                delay = min(delay * 2, 60)
+        engine.dispose()
+
+    def listen(self, engine) -> None:
+        connection = engine.raw_connection()
+        try:
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            dbapi_connection.cursor().execute(f"LISTEN {CHANNEL}")
+            self.bus.reset()
+            while not self._stop.is_set():
+                if wait_readable([dbapi_connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                notifications = dbapi_connection.notifies[:]
+                del dbapi_connection.notifies[:]
+                deliver([json.loads(notification.payload) for notification in notifications], self.bus)
+        finally:
+            connection.close()
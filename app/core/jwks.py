@@ -0,0 +1,177 @@
+import json
+import logging
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import jwt
+from jwt import PyJWK, PyJWKSet
+
+from app.core.config import settings
+
+
+class JWKSKeyStore:
+    """Process-wide cache of the Cognito signing keys, indexed by ``kid``.
+
+    Keys are served from memory until ``ttl`` expires. Once a key set is older
+    than ``refresh_interval`` it is still served, but a refresh is started in a
+    background thread. An unknown ``kid`` triggers at most one synchronous
+    refetch per ``min_refetch_interval``; concurrent callers wait on the same
+    fetch instead of each hitting Cognito.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl: float = 3600,
+        refresh_interval: float = 900,
+        min_refetch_interval: float = 30,
+        timeout: float = 5,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self._keys: Dict[str, PyJWK] = {}
+        self._fetched_at: float = 0.0
+        self._last_attempt: float = 0.0
+        self._attempts = 0
+        # _fetch_lock serializes fetches; _lock only guards swapping the key set and the
+        # _refreshing flag, so requests with a cached key never wait on the network
+        self._fetch_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.fetch_count = 0
+
+    def _fetch(self) -> Dict[str, PyJWK]:
+        # urllib handles both https:// and file:// so tests can point at a local JWKS file
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            data = json.loads(response.read())
+        self.fetch_count += 1
+        return {key.key_id: key for key in PyJWKSet.from_dict(data).keys if key.key_id}
+
+    def refresh(self, seen_attempts: Optional[int] = None) -> bool:
+        """Fetch the key set now. Only one caller fetches at a time; callers that
+        pass ``seen_attempts`` skip the fetch if another thread finished one
+        while they were waiting for the lock."""
+        with self._fetch_lock:
+            if seen_attempts is not None and self._attempts != seen_attempts:
+                return bool(self._keys)
+            self._last_attempt = time.monotonic()
+            try:
+                keys = self._fetch()
+            except Exception as e:
+                logging.warning(f"Could not refresh JWKS from {self.url}: {e}")
+                return False
+            finally:
+                self._attempts += 1
+            with self._lock:
+                self._keys = keys
+                self._fetched_at = time.monotonic()
+            return True
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="jwks-refresh", daemon=True).start()
+
+    def get_signing_key(self, kid: str) -> PyJWK:
+        attempts = self._attempts
+        age = time.monotonic() - self._fetched_at
+        if not self._fetched_at or age >= self.ttl:
+            if not self.refresh(seen_attempts=attempts) and time.monotonic() - self._fetched_at >= self.ttl:
+                # Expired and Cognito is unreachable: evict rather than trust stale keys
+                self._keys = {}
+        elif age >= self.refresh_interval:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._last_attempt >= self.min_refetch_interval:
+            # Unknown kid, probably a key rotation: one refetch, shared by concurrent callers
+            self.refresh(seen_attempts=attempts)
+            key = self._keys.get(kid)
+        if key is None:
+            raise jwt.PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return key
+
+    def get_signing_key_from_jwt(self, token: str) -> PyJWK:
+        header = jwt.get_unverified_header(token)
+        return self.get_signing_key(header.get("kid"))
+
+    def clear(self) -> None:
+        with self._fetch_lock, self._lock:
+            self._keys = {}
+            self._fetched_at = 0.0
+            self._last_attempt = 0.0
+
+
+class TokenClaimsCache:
+    """Short-lived LRU of already verified tokens and their decoded claims.
+
+    Entries never outlive the token's own ``exp`` claim.
+    """
+
+    def __init__(self, ttl: float = 60, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, claims = entry
+            if time.time() >= expires_at:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return claims
+
+    def set(self, token: str, claims: Dict) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        with self._lock:
+            self._entries[token] = (expires_at, claims)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+jwks_store = JWKSKeyStore(
+    settings.COGNITO_KEYS_URL,
+    ttl=settings.JWKS_CACHE_TTL,
+    refresh_interval=settings.JWKS_REFRESH_INTERVAL,
+    min_refetch_interval=settings.JWKS_MIN_REFETCH_INTERVAL,
+)
+token_cache = TokenClaimsCache(ttl=settings.TOKEN_CACHE_TTL, maxsize=settings.TOKEN_CACHE_SIZE)
+
+
+def decode_token(token: str) -> Dict:
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    signing_key = jwks_store.get_signing_key_from_jwt(token)
+    claims = jwt.decode(token, signing_key.key, algorithms=["RS256"])
+    token_cache.set(token, claims)
+    return claims
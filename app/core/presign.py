@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from app.core.aws import get_s3_client
+from app.core.config import settings
+from app.core.metrics import S3_OPERATION_DURATION
+
+
+def key_from_file_path(file_path: str, bucket: Optional[str] = None) -> str:
+    """Return the S3 key for a stored ``file_path``.
+
+    Rows written before file_path held keys contain a presigned URL; the key is
+    recovered from its path (virtual-hosted or path-style).
+    """
+    if not file_path.startswith(("http://", "https://")):
+        return file_path
+    bucket = bucket or settings.S3_BUCKET_NAME
+    url = urlparse(file_path)
+    path = url.path.lstrip("/")
+    if not url.netloc.startswith(f"{bucket}.") and path.startswith(f"{bucket}/"):
+        path = path[len(bucket) + 1:]
+    return unquote(path)
+
+
+class PresignedUrlCache:
+    """LRU of presigned GET URLs keyed by (key, ttl, time bucket).
+
+    A time bucket lasts half the TTL, so a URL served from the cache is always
+    valid for at least ``ttl / 2`` more seconds.
+    """
+
+    def __init__(self, maxsize: int = 50000):
+        self.maxsize = maxsize
+        self._urls: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, ttl: int) -> str:
+        cache_key = (key, ttl, int(time.time() // max(ttl // 2, 1)))
+        with self._lock:
+            url = self._urls.get(cache_key)
+            if url is not None:
+                self._urls.move_to_end(cache_key)
+                self.hits += 1
+                return url
+        with S3_OPERATION_DURATION.labels("presign").time():
+            url = get_s3_client().generate_presigned_url(
+                "get_object",
+                Params={"Bucket": settings.S3_BUCKET_NAME, "Key": key},
+                ExpiresIn=ttl,
+            )
+        with self._lock:
+            self.misses += 1
+            self._urls[cache_key] = url
+            while len(self._urls) > self.maxsize:
+                self._urls.popitem(last=False)
+        return url
+
+    def clear(self) -> None:
+        with self._lock:
+            self._urls.clear()
+
+
+url_cache = PresignedUrlCache(maxsize=settings.PRESIGNED_URL_CACHE_SIZE)
+
+
+def presigned_url(file_path: str, ttl: Optional[int] = None) -> str:
+    return url_cache.get(key_from_file_path(file_path), ttl or settings.PRESIGNED_URL_TTL)
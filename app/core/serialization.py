@@ -0,0 +1,18 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+# Matches what Pydantic emits for ApplicationBase: enums as their value, datetimes in ISO 8601
+# (UTC as "Z"). orjson is several times faster than the standard library encoder.
+OPTIONS = orjson.OPT_UTC_Z
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, option=OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson. Return it from a route to skip the response_model validation
+    of every row; the content must already have the response model's shape."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -1,19 +1,38 @@
+import asyncio
+import base64
+import hashlib
+import json
 import os
 import shutil
-import boto3
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+from sqlalchemy import bindparam, insert, literal, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from app.core.config import Settings
 from app.schemas import schemas
 from app.models import models
+from app.crud import crud_summary
 from fastapi import HTTPException, UploadFile
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+from fastapi.concurrency import run_in_threadpool
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
 from app.core.config import settings
+from app.core.aws import get_s3_client
+from app.core import events
+from app.core.cache import invalidate_applications
+from app.core.metrics import S3_OPERATION_DURATION, timed_crud
 
-s3_client = boto3.client(
-    "s3",
-    region_name=settings.REGION,
-)
+# S3 rejects multipart parts smaller than 5MB (except the last one)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
 
+# An uploaded document: its S3 key, and the hash and size of its content when known
+class StoredFile(NamedTuple):
+    key: str
+    sha256: Optional[str]
+    size: Optional[int]
+
+@timed_crud
 def create_application(db: Session, application: schemas.ApplicationBase):
     db_application = models.Application(
         user_id=application.user_id,
@@ -21,54 +40,343 @@ def create_application(db: Session, application: schemas.ApplicationBase):
         name=application.name
     )
     db.add(db_application)
+    crud_summary.record_changes(db, [None], [crud_summary.fact(db_application)])
     db.commit()
     db.refresh(db_application)
+    invalidate_applications(user_ids=[db_application.user_id])
     return db_application
 
-def get_applications(db: Session, user_id: str, skip: int = 0, limit: int = 100):
-    return db.query(models.Application).filter(models.Application.user_id == user_id).offset(skip).limit(limit).all()
-
+# Documents are part of every ApplicationBase response, so the read paths load them with one
+# extra SELECT ... IN instead of a lazy load per application during serialization.
+@timed_crud
 def get_application(db: Session, application_id: int):
-    return db.query(models.Application).filter(models.Application.id == application_id).first()
+    return (
+        db.query(models.Application)
+        .options(selectinload(models.Application.documents))
+        .filter(models.Application.id == application_id)
+        .first()
+    )
+
+def encode_cursor(application) -> str:
+    # Opaque to clients: base64 of the (created_at, id) keyset position of the last row served
+    position = json.dumps([application.created_at.isoformat(), application.id])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, application_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), int(application_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# The ApplicationBase fields stored on the application row
+LIST_COLUMNS = ["id", "scholarship_id", "user_id", "status", "created_at", "name", "user_response", "grade", "select"]
+
+def build_list_query(
+        user_id: Optional[str] = None,
+        scholarship_id: Optional[int] = None,
+        statuses: Optional[List[schemas.ApplicationStatus]] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        skip: int = 0,
+    ):
+    # Keyset pagination on (created_at, id): deep pages cost the same as the first one.
+    # One extra row is fetched to tell whether there is a next page. Plain rows of the
+    # listed columns are selected, not ORM objects.
+    stmt = select(*(models.Application.__table__.c[column] for column in LIST_COLUMNS))
+    if user_id is not None:
+        stmt = stmt.where(models.Application.user_id == user_id)
+    if scholarship_id is not None:
+        stmt = stmt.where(models.Application.scholarship_id == scholarship_id)
+    if statuses:
+        stmt = stmt.where(models.Application.status.in_([models.ApplicationStatus(s) for s in statuses]))
+    if cursor:
+        created_at, application_id = decode_cursor(cursor)
+        position = tuple_(
+            literal(created_at, models.Application.created_at.type),
+            literal(application_id, models.Application.id.type),
+        )
+        stmt = stmt.where(tuple_(models.Application.created_at, models.Application.id) > position)
+    elif skip:
+        # Kept for clients still paging with skip; slow for deep pages
+        stmt = stmt.offset(skip)
+    return stmt.order_by(models.Application.created_at, models.Application.id).limit(limit + 1)
 
+def to_page(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+def to_records(rows, document_rows) -> List[Dict]:
+    # Plain dicts shaped like ApplicationBase, without building ORM objects or Pydantic models.
+    # file_path still holds the S3 key.
+    records = {}
+    for row in rows:
+        record = row._asdict()
+        record["documents"] = []
+        records[row.id] = record
+    for document in document_rows:
+        records[document.application_id]["documents"].append({"name": document.name, "file_path": document.file_path})
+    return list(records.values())
+
+@timed_crud
+def list_application_records(db: Session, limit: int = 100, **filters) -> Tuple[List[Dict], Optional[str]]:
+    rows, next_cursor = to_page(db.execute(build_list_query(limit=limit, **filters)).all(), limit)
+    document_rows = db.execute(documents_query([row.id for row in rows])).all() if rows else []
+    return to_records(rows, document_rows), next_cursor
+
+@timed_crud
+async def list_application_records_async(db: AsyncSession, limit: int = 100, **filters) -> Tuple[List[Dict], Optional[str]]:
+    result = await db.execute(build_list_query(limit=limit, **filters))
+    rows, next_cursor = to_page(result.all(), limit)
+    document_rows = (await db.execute(documents_query([row.id for row in rows]))).all() if rows else []
+    return to_records(rows, document_rows), next_cursor
+
+@timed_crud
+async def get_application_async(db: AsyncSession, application_id: int):
+    result = await db.execute(
+        select(models.Application)
+        .options(selectinload(models.Application.documents))
+        .where(models.Application.id == application_id)
+    )
+    return result.scalars().first()
+
+# Published to GET /applications/events once the caller's transaction commits
+def emit_status_events(db: Session, applications: List[models.Application]) -> None:
+    events.emit(db, [
+        events.status_event(a.id, a.user_id, a.scholarship_id, a.status, a.select) for a in applications
+    ])
+
+@timed_crud
 def update_application_status(db: Session, application_id: int, status: schemas.ApplicationStatus, grade: float = None, reason: str = None):
-    db_application = db.query(models.Application).filter(models.Application.id == application_id).first()
+    # Locked until commit, so a concurrent change can't make the summary's "before" stale
+    db_application = db.query(models.Application).filter(models.Application.id == application_id).with_for_update().first()
+    before = crud_summary.fact(db_application)
     db_application.status = status
     if grade is not None:
         db_application.grade = grade
     if reason is not None:
         db_application.reason = reason
+    crud_summary.record_changes(db, [before], [crud_summary.fact(db_application)])
+    # Also invalidates the cached application on commit
+    emit_status_events(db, [db_application])
     db.commit()
     db.refresh(db_application)
     return db_application
 
-def create_document(db: Session, application_id: int, document_name: str, file_location: str):
-    # Create the document template record
-    new_document = models.DocumentTemplate(
-        application_id=application_id,
-        name=document_name,
-        file_path=file_location
+@timed_crud
+def bulk_update_status(db: Session, scholarship_id: int, from_status: schemas.ApplicationStatus, to_status: schemas.ApplicationStatus, commit: bool = True):
+    # One UPDATE ... RETURNING in one transaction instead of a SELECT/UPDATE/COMMIT per application.
+    # Core rows are returned so reading them after the commit doesn't trigger a refresh per row.
+    # With commit=False the caller commits. The cache is invalidated on commit, with the events.
+    table = models.Application.__table__
+    stmt = (
+        update(table)
+        .where(table.c.scholarship_id == scholarship_id, table.c.status == models.ApplicationStatus(from_status))
+        .values(status=models.ApplicationStatus(to_status))
+        .returning(*table.c)
     )
-    db.add(new_document)
-    db.commit()
-    db.refresh(new_document)
-    return new_document
+    try:
+        rows = db.execute(stmt).mappings().all()
+        moved = [crud_summary.fact(row) for row in rows]
+        # Every returned row left from_status
+        crud_summary.record_changes(
+            db, [(scholarship_id, models.ApplicationStatus(from_status), selected, grade) for _, _, selected, grade in moved], moved
+        )
+        events.emit(db, [
+            events.status_event(row["id"], row["user_id"], row["scholarship_id"], row["status"], row["select"]) for row in rows
+        ])
+        if not commit:
+            return rows
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return rows
 
-async def create_application_document(db: Session, application_id: int, file: UploadFile) -> models.DocumentTemplate:
-    
-    document_name = get_filename_without_extension(file)
+@timed_crud
+def apply_grading_results(db: Session, results: List[Dict]) -> int:
+    # results: [{"id", "status", "select", "grade", "reason"}]. Every value is absolute, so
+    # applying the same results twice (e.g. a redelivered message) leaves the rows unchanged.
+    if not results:
+        return 0
+    table = models.Application.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(
+            status=bindparam("b_status"),
+            select=bindparam("b_select"),
+            grade=bindparam("b_grade"),
+            reason=bindparam("b_reason"),
+        )
+    )
+    params = [
+        {
+            "b_id": result["id"],
+            "b_status": models.ApplicationStatus(result["status"]),
+            "b_select": result["select"],
+            "b_grade": result["grade"],
+            "b_reason": result["reason"],
+        }
+        for result in results
+    ]
+    application_ids = [result["id"] for result in results]
+    try:
+        # The previous values, for the scholarship summary and the cache invalidation; the rows
+        # stay locked until commit, in id order so two messages can't deadlock, and the summary
+        # deltas are computed from what actually gets replaced
+        current = {
+            row["id"]: row for row in db.execute(
+                select(table.c.id, table.c.user_id, table.c.scholarship_id, table.c.status, table.c.select, table.c.grade)
+                .where(table.c.id.in_(application_ids))
+                .order_by(table.c.id)
+                .with_for_update()
+            ).mappings()
+        }
+        # executemany, sent in pages with execute_batch on psycopg2 (see engine_options); one
+        # commit for the whole message
+        db.execute(stmt, params)
+        # The last result for an application is the one that sticks
+        final = {p["b_id"]: p for p in params if p["b_id"] in current}
+        # rowcount isn't reliable for a batched executemany
+        updated = len(final)
+        crud_summary.record_changes(
+            db,
+            [crud_summary.fact(row) for row in current.values()],
+            [(current[i]["scholarship_id"], p["b_status"], bool(p["b_select"]), p["b_grade"]) for i, p in final.items()],
+        )
+        events.emit(db, [
+            events.status_event(i, current[i]["user_id"], current[i]["scholarship_id"], p["b_status"], p["b_select"])
+            for i, p in final.items()
+            if (current[i]["status"], bool(current[i]["select"])) != (p["b_status"], bool(p["b_select"]))
+        ])
+        # Grades and reasons change without an event too
+        events.invalidate_on_commit(db, application_ids, [row["user_id"] for row in current.values()])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return updated
 
-    if not document_name:
-        raise HTTPException(status_code=400, detail="Document name could not be determined")
+def documents_query(application_ids: List[int]):
+    table = models.DocumentTemplate.__table__
+    return (
+        select(table.c.id, table.c.application_id, table.c.name, table.c.file_path)
+        .where(table.c.application_id.in_(application_ids))
+        .order_by(table.c.id)
+    )
 
-    # Save the document file
-    file_location = await save_file(file)
-    
-    if not file_location:
-        raise HTTPException(status_code=500, detail="Could not save document file")
-    
-    # Create the document template record
-    return create_document(db, application_id, document_name, get_file_url(file_location))
+@timed_crud
+def get_documents_by_application_ids(db: Session, application_ids: List[int]) -> Dict[int, List[Dict]]:
+    documents: Dict[int, List[Dict]] = {application_id: [] for application_id in application_ids}
+    if not application_ids:
+        return documents
+    for row in db.execute(documents_query(application_ids)):
+        documents[row.application_id].append({"id": row.id, "name": row.name, "file_path": row.file_path})
+    return documents
+
+EXPORT_COLUMNS = ["id", "scholarship_id", "user_id", "name", "status", "created_at", "user_response", "grade", "reason", "select"]
+
+def iter_applications_for_export(db: Session, scholarship_id: int, batch_size: int = 1000) -> Iterator[Dict]:
+    # Streams every application of a scholarship with its documents in constant memory: two
+    # server-side cursors (applications and their documents, both ordered by application id)
+    # merged as they are read, so documents cost one query in total instead of one per row.
+    applications = models.Application.__table__
+    documents = models.DocumentTemplate.__table__
+    stream = {"yield_per": batch_size}
+    application_rows = db.execute(
+        select(*(applications.c[column] for column in EXPORT_COLUMNS))
+        .where(applications.c.scholarship_id == scholarship_id)
+        .order_by(applications.c.id),
+        execution_options=stream,
+    ).mappings()
+    document_rows = iter(db.execute(
+        select(documents.c.application_id, documents.c.name, documents.c.file_path)
+        .join(applications, applications.c.id == documents.c.application_id)
+        .where(applications.c.scholarship_id == scholarship_id)
+        .order_by(documents.c.application_id, documents.c.id),
+        execution_options=stream,
+    ))
+    document = next(document_rows, None)
+    for row in application_rows:
+        application = dict(row)
+        application["documents"] = []
+        while document is not None and document.application_id <= row["id"]:
+            if document.application_id == row["id"]:
+                application["documents"].append({"name": document.name, "file_path": document.file_path})
+            document = next(document_rows, None)
+        yield application
+
+@timed_crud
+def create_application_with_documents(db: Session, application: schemas.ApplicationBase, documents: List[Tuple[str, StoredFile]]) -> models.Application:
+    # documents: [(document name, stored file)] of files that are already uploaded. file_path
+    # stores the key; URLs are presigned when documents are serialized.
+    # The application and all of its documents are written in a single commit.
+    db_application = models.Application(
+        user_id=application.user_id,
+        scholarship_id=application.scholarship_id,
+        name=application.name
+    )
+    db_application.documents = [
+        models.DocumentTemplate(name=name, file_path=stored.key, sha256=stored.sha256, size=stored.size)
+        for name, stored in documents
+    ]
+    db.add(db_application)
+    crud_summary.record_changes(db, [None], [crud_summary.fact(db_application)])
+    db.commit()
+    db.refresh(db_application)
+    # Load the documents here so serializing the response doesn't hit the DB on the event loop
+    db_application.documents
+    invalidate_applications(user_ids=[db_application.user_id])
+    return db_application
+
+@timed_crud
+def bulk_create_applications(db: Session, applications: List[schemas.BulkApplicationCreate]) -> List[int]:
+    # One multi-row INSERT ... RETURNING for the applications (SQLAlchemy pages it by
+    # insertmanyvalues_page_size), one executemany for their documents, one commit.
+    # Every document must carry its S3 key. Returns the new ids in the order of `applications`.
+    if not applications:
+        return []
+    table = models.Application.__table__
+    # SQLite can't batch an INSERT whose RETURNING must follow the parameter order and would send
+    # one statement per row; its rowids are handed out in VALUES order though, so sort them instead
+    ordered = db.get_bind().dialect.name != "sqlite"
+    try:
+        ids = db.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=ordered),
+            [
+                {"user_id": application.user_id, "scholarship_id": application.scholarship_id, "name": application.name}
+                for application in applications
+            ],
+        ).scalars().all()
+        if not ordered:
+            ids = sorted(ids)
+        documents = [
+            {
+                "application_id": application_id,
+                "name": document.name,
+                "file_path": document.key,
+                "sha256": document.sha256,
+                "size": document.size,
+            }
+            for application_id, application in zip(ids, applications)
+            for document in application.documents
+        ]
+        if documents:
+            db.execute(insert(models.DocumentTemplate.__table__), documents)
+        crud_summary.record_changes(
+            db,
+            [None] * len(applications),
+            [(application.scholarship_id, models.ApplicationStatus.submitted, False, None) for application in applications],
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_applications(user_ids=list({application.user_id for application in applications}))
+    return ids
 
 def get_filename_without_extension(file: UploadFile) -> str:
     if file is None or file.filename is None:
@@ -77,42 +385,127 @@ def get_filename_without_extension(file: UploadFile) -> str:
     filename, _ = os.path.splitext(file.filename)
     return filename
 
-def get_file_url(filename: str) -> str:
+def upload_fileobj(fileobj: BinaryIO, key: str, part_size: int = None) -> int:
+    # Streams the file to S3 holding at most one part in memory. Files smaller than a part
+    # go up with a single put_object; anything bigger uses a multipart upload.
+    part_size = max(part_size or settings.S3_UPLOAD_PART_SIZE, S3_MIN_PART_SIZE)
+    s3_client = get_s3_client()
+    bucket = str(settings.S3_BUCKET_NAME)
+
+    chunk = fileobj.read(part_size)
+    if len(chunk) < part_size:
+        with S3_OPERATION_DURATION.labels("put_object").time():
+            s3_client.put_object(Bucket=bucket, Key=key, Body=chunk)
+        return len(chunk)
+
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+    parts = []
+    size = 0
     try:
-        print("Getting file URL: ", filename)
-        # Generate pre-signed URL - this is synchronous
-        url = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": settings.S3_BUCKET_NAME, "Key": filename},
-            ExpiresIn=100000,
+        while chunk:
+            part_number = len(parts) + 1
+            with S3_OPERATION_DURATION.labels("upload_part").time():
+                part = s3_client.upload_part(
+                    Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=chunk
+                )
+            parts.append({"ETag": part["ETag"], "PartNumber": part_number})
+            size += len(chunk)
+            chunk = fileobj.read(part_size)
+        s3_client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
         )
-        return url
-    except s3_client.exceptions.NoSuchKey:
-        raise HTTPException(status_code=404, detail=f"File {filename} not found in bucket.")
-    except (NoCredentialsError, PartialCredentialsError):
-        raise HTTPException(status_code=500, detail="Invalid AWS credentials")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return size
+
+def document_namespace(scholarship_id: int, user_id: str) -> str:
+    return f"{scholarship_id}/{quote(user_id, safe='')}"
+
+def document_prefix(namespace: str) -> str:
+    return f"{settings.DOCUMENT_KEY_PREFIX}{namespace}/"
 
-async def save_file(file: UploadFile) -> str:
+def document_key(namespace: str, sha256: str, filename: str) -> str:
+    # Content-addressed: two applicants' CV.pdf never share a key, and the same bytes
+    # uploaded again in the same namespace map to the object that is already there
+    extension = os.path.splitext(filename)[1].lower()
+    return f"{document_prefix(namespace)}{sha256}{extension}"
+
+def hash_fileobj(fileobj: BinaryIO, chunk_size: int = 1024 * 1024) -> Tuple[str, int]:
+    # One pass over the spooled upload; the file is rewound for the upload that follows
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := fileobj.read(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+def object_size(key: str) -> Optional[int]:
+    # Size of the object at key, or None if there is none. Without s3:ListBucket, S3 answers
+    # a HEAD on a missing key with 403 rather than 404, so that is "not known to exist" too.
+    try:
+        with S3_OPERATION_DURATION.labels("head_object").time():
+            response = get_s3_client().head_object(Bucket=str(settings.S3_BUCKET_NAME), Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("403", "404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return response["ContentLength"]
+
+def object_sizes(prefix: str) -> Dict[str, int]:
+    # Size of every object under prefix, one LIST call per 1000 keys
+    sizes = {}
+    kwargs = {"Bucket": str(settings.S3_BUCKET_NAME), "Prefix": prefix}
+    while True:
+        with S3_OPERATION_DURATION.labels("list_objects_v2").time():
+            response = get_s3_client().list_objects_v2(**kwargs)
+        sizes.update((item["Key"], item["Size"]) for item in response.get("Contents", []))
+        if not response.get("IsTruncated"):
+            return sizes
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+def object_exists(key: str) -> bool:
+    return object_size(key) is not None
+
+def put_document(fileobj: BinaryIO, filename: str, namespaces: List[str]) -> List[StoredFile]:
+    # Hash once, then store under each namespace unless the object is already there
+    sha256, size = hash_fileobj(fileobj)
+    stored = []
+    for namespace in namespaces:
+        key = document_key(namespace, sha256, filename)
+        if not object_exists(key):
+            upload_fileobj(fileobj, key)
+            fileobj.seek(0)
+        stored.append(StoredFile(key, sha256, size))
+    return stored
+
+async def save_file(file: UploadFile, namespaces: List[str]) -> List[StoredFile]:
     if not file.filename:
         raise HTTPException(status_code=400, detail="File must have a valid filename.")
     
     try:
-        file_content = await file.read()  # This needs to be awaited as it's from FastAPI
-        key = str(file.filename)
-        # This is synchronous and doesn't need await
-        s3_client.put_object(
-            Bucket=str(settings.S3_BUCKET_NAME),
-            Key=key,
-            Body=file_content
-        )
-        return key
+        # boto3 is blocking, so hash and stream the spooled upload to S3 from the threadpool
+        return await run_in_threadpool(put_document, file.file, str(file.filename), namespaces)
     except (NoCredentialsError, PartialCredentialsError):
         raise HTTPException(status_code=500, detail="Invalid AWS credentials")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
 
+async def save_files_to_namespaces(uploads: List[Tuple[UploadFile, List[str]]]) -> List[List[StoredFile]]:
+    # Upload several documents at once, at most S3_UPLOAD_CONCURRENCY at a time. Each file is
+    # handled by one task, since its namespaces share the same file object.
+    semaphore = asyncio.Semaphore(settings.S3_UPLOAD_CONCURRENCY)
+
+    async def save(file: UploadFile, namespaces: List[str]) -> List[StoredFile]:
+        async with semaphore:
+            return await save_file(file, namespaces)
+
+    return list(await asyncio.gather(*(save(file, namespaces) for file, namespaces in uploads)))
+
+async def save_files(files: List[UploadFile], namespace: str) -> List[StoredFile]:
+    return [stored for stored, in await save_files_to_namespaces([(file, [namespace]) for file in files])]
+
 # def save_file(file: UploadFile, directory: str) -> str:
 #     # Create the directory if it doesn't exist
 #     if not file.filename:
@@ -139,26 +532,20 @@ async def save_file(file: UploadFile) -> str:
 #     #     f.write(file.file.read())
 #     return file_path
 
-def get_applications_by_scholarship(db: Session, scholarship_id: int):
-    try:
-        applications = db.query(models.Application).filter(
-            models.Application.scholarship_id == scholarship_id
-        ).all()
-        if not applications:
-            print(f"No applications found for scholarship_id {scholarship_id}")
-        return applications
-    except Exception as e:
-        print(e)
-        raise
-
+@timed_crud
 def update_application_select(db: Session, application_id: int, select: bool):
-    db_application = db.query(models.Application).filter(models.Application.id == application_id).first()
+    db_application = db.query(models.Application).filter(models.Application.id == application_id).with_for_update().first()
     if not db_application:
         raise HTTPException(status_code=404, detail="Application not found")
+    before = crud_summary.fact(db_application)
     db_application.select = select
+    crud_summary.record_changes(db, [before], [crud_summary.fact(db_application)])
+    # Also invalidates the cached application on commit
+    emit_status_events(db, [db_application])
     db.commit()
     db.refresh(db_application)
     return db_application
 
+@timed_crud
 def get_all_applications(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Application).offset(skip).limit(limit).all()
\ No newline at end of file
@@ -0,0 +1,161 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, delete, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.metrics import timed_crud
+from app.models import models
+
+# (scholarship_id, status, select, grade) of one application; None for "doesn't exist"
+Fact = Tuple[int, models.ApplicationStatus, bool, Optional[float]]
+
+COUNTERS = ("application_count", "selected_count", "graded_count", "grade_sum")
+PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+
+UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def fact(application) -> Fact:
+    # Works for ORM objects and for Core row mappings
+    if isinstance(application, models.Application):
+        return application.scholarship_id, models.ApplicationStatus(application.status), bool(application.select), application.grade
+    return application["scholarship_id"], models.ApplicationStatus(application["status"]), bool(application["select"]), application["grade"]
+
+
+def record_changes(db: Session, before: Iterable[Optional[Fact]], after: Iterable[Optional[Fact]]) -> None:
+    """Apply the difference between two sets of application facts to the summary table, in the
+    caller's transaction. Call it before the commit that changes the applications."""
+    deltas: Dict[Tuple[int, models.ApplicationStatus], List[float]] = defaultdict(lambda: [0, 0, 0, 0.0])
+    for sign, facts in ((-1, before), (1, after)):
+        for item in facts:
+            if item is None:
+                continue
+            scholarship_id, status, selected, grade = item
+            delta = deltas[(scholarship_id, status)]
+            delta[0] += sign
+            delta[1] += sign * selected
+            if grade is not None:
+                delta[2] += sign
+                delta[3] += sign * grade
+    for (scholarship_id, status), delta in deltas.items():
+        if any(delta):
+            upsert(db, scholarship_id, status, dict(zip(COUNTERS, delta)))
+
+
+def upsert(db: Session, scholarship_id: int, status: models.ApplicationStatus, delta: Dict) -> None:
+    table = models.ScholarshipSummary.__table__
+    dialect_insert = UPSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(scholarship_id=scholarship_id, status=status, **delta)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.scholarship_id, table.c.status],
+            set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS},
+        ))
+        return
+    updated = db.execute(
+        update(table)
+        .where(table.c.scholarship_id == scholarship_id, table.c.status == status)
+        .values({name: table.c[name] + value for name, value in delta.items()})
+    ).rowcount
+    if not updated:
+        db.execute(insert(table).values(scholarship_id=scholarship_id, status=status, **delta))
+
+
+def summary_query(scholarship_id: Optional[int] = None):
+    # The GROUP BY the summary table caches
+    table = models.Application.__table__
+    stmt = select(
+        table.c.scholarship_id,
+        table.c.status,
+        func.count().label("application_count"),
+        func.coalesce(func.sum(case((table.c.select, 1), else_=0)), 0).label("selected_count"),
+        func.count(table.c.grade).label("graded_count"),
+        func.coalesce(func.sum(table.c.grade), 0.0).label("grade_sum"),
+    ).group_by(table.c.scholarship_id, table.c.status)
+    if scholarship_id is not None:
+        stmt = stmt.where(table.c.scholarship_id == scholarship_id)
+    return stmt
+
+
+@timed_crud
+def rebuild_summaries(db: Session, scholarship_id: Optional[int] = None) -> int:
+    """Recompute the summary rows from the applications (backfill, or repair after concurrent writers)."""
+    table = models.ScholarshipSummary.__table__
+    stmt = delete(table)
+    if scholarship_id is not None:
+        stmt = stmt.where(table.c.scholarship_id == scholarship_id)
+    db.execute(stmt)
+    rows = [dict(row) for row in db.execute(summary_query(scholarship_id)).mappings()]
+    if rows:
+        db.execute(insert(table), rows)
+    db.commit()
+    return len(rows)
+
+
+def backfill_if_empty(db: Session) -> int:
+    """Build the summary table when it is empty but there are applications, e.g. on the first start
+    after an upgrade. Another worker doing the same at once makes this one a no-op."""
+    if db.scalar(select(exists().select_from(models.ScholarshipSummary.__table__))):
+        return 0
+    if not db.scalar(select(exists().select_from(models.Application.__table__))):
+        return 0
+    try:
+        return rebuild_summaries(db)
+    except IntegrityError:
+        db.rollback()
+        return 0
+
+
+@timed_crud
+def get_summary(db: Session, scholarship_id: int) -> Dict:
+    table = models.ScholarshipSummary.__table__
+    rows = db.execute(select(table).where(table.c.scholarship_id == scholarship_id)).mappings().all()
+    # A negative counter means applications were written without going through app.crud:
+    # the incremental updates can't be trusted, so recompute this scholarship
+    if any(row[name] < 0 for row in rows for name in COUNTERS):
+        rebuild_summaries(db, scholarship_id)
+        rows = db.execute(select(table).where(table.c.scholarship_id == scholarship_id)).mappings().all()
+    graded = sum(row["graded_count"] for row in rows)
+    return {
+        "total": sum(row["application_count"] for row in rows),
+        "by_status": {status: 0 for status in models.ApplicationStatus} | {
+            models.ApplicationStatus(row["status"]): row["application_count"] for row in rows
+        },
+        "selected": sum(row["selected_count"] for row in rows),
+        "graded": graded,
+        "mean": sum(row["grade_sum"] for row in rows) / graded if graded else None,
+    }
+
+
+@timed_crud
+def grade_distribution(db: Session, scholarship_id: int, percentiles: Sequence[float] = PERCENTILES) -> Dict:
+    # One pass over the (scholarship_id, grade) index: cume_dist ranks the grades and each
+    # percentile is the smallest grade at or above it (nearest rank)
+    table = models.Application.__table__
+    ranked = (
+        select(table.c.grade, func.cume_dist().over(order_by=table.c.grade).label("cume_dist"))
+        .where(table.c.scholarship_id == scholarship_id, table.c.grade.is_not(None))
+        .subquery()
+    )
+    labels = [f"p{round(p * 100)}" for p in percentiles]
+    row = db.execute(select(
+        func.min(ranked.c.grade).label("min"),
+        func.max(ranked.c.grade).label("max"),
+        *(func.min(ranked.c.grade).filter(ranked.c.cume_dist >= p).label(label) for p, label in zip(percentiles, labels)),
+    )).mappings().one()
+    return {"min": row["min"], "max": row["max"], "percentiles": {label: row[label] for label in labels}}
+
+
+@timed_crud
+def top_ranked(db: Session, scholarship_id: int, limit: int) -> List[Dict]:
+    table = models.Application.__table__
+    rows = db.execute(
+        select(table.c.id, table.c.user_id, table.c.name, table.c.status, table.c.grade, table.c.select)
+        .where(table.c.scholarship_id == scholarship_id, table.c.grade.is_not(None))
+        .order_by(table.c.grade.desc(), table.c.id)
+        .limit(limit)
+    ).mappings().all()
+    return [{"rank": rank, **row} for rank, row in enumerate(rows, 1)]
@@ -0,0 +1,99 @@
+"""One-off data migrations that SQLModel.metadata.create_all can't express.
+
+    python -m app.db.migrations
+
+Every migration is idempotent and safe to run again.
+"""
+import logging
+
+from sqlalchemy import bindparam, create_engine, inspect, or_, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel
+
+from app.core.presign import key_from_file_path
+from app.crud import crud_summary
+from app.db.session import DATABASE_URL, engine, is_memory_sqlite
+from app.models import models
+
+logging.basicConfig(level=logging.INFO)
+
+
+def add_missing_columns(db: Session) -> int:
+    # create_all doesn't add new columns to existing tables; new columns must be nullable to be added this way
+    connection = db.connection()
+    preparer = connection.dialect.identifier_preparer
+    inspector = inspect(connection)
+    added = 0
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=connection.dialect)}"
+                ))
+                added += 1
+    db.commit()
+    return added
+
+
+def migrate_document_keys(db: Session, batch_size: int = 1000) -> int:
+    # DocumentTemplate.file_path used to hold a presigned URL; rewrite those rows to the bare S3 key
+    table = models.DocumentTemplate.__table__
+    is_url = or_(table.c.file_path.like("http://%"), table.c.file_path.like("https://%"))
+    stmt = update(table).where(table.c.id == bindparam("b_id")).values(file_path=bindparam("b_file_path"))
+    migrated = 0
+    while True:
+        rows = db.execute(select(table.c.id, table.c.file_path).where(is_url).limit(batch_size)).all()
+        if not rows:
+            return migrated
+        db.execute(stmt, [{"b_id": row.id, "b_file_path": key_from_file_path(row.file_path)} for row in rows])
+        db.commit()
+        migrated += len(rows)
+
+
+def create_missing_indexes(db: Session) -> int:
+    # create_all only creates indexes together with their table, not on tables that already exist
+    connection = db.connection()
+    existing = {
+        table.name: {index["name"] for index in inspect(connection).get_indexes(table.name)}
+        for table in SQLModel.metadata.sorted_tables
+    }
+    created = 0
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing[table.name]:
+                index.create(connection)
+                created += 1
+    db.commit()
+    return created
+
+
+def backfill_scholarship_summaries(db: Session) -> int:
+    # The summary table is only updated incrementally; rebuild it from the applications
+    return crud_summary.rebuild_summaries(db)
+
+
+MIGRATIONS = [add_missing_columns, migrate_document_keys, create_missing_indexes, backfill_scholarship_summaries]
+
+
+def migration_engine(url: str = DATABASE_URL) -> Engine:
+    # Not the API engine: its DB_STATEMENT_TIMEOUT_MS would cancel index builds and summary
+    # backfills on a large table. The in-memory database only exists on the app's engine.
+    if is_memory_sqlite(url):
+        return engine
+    return create_engine(url, poolclass=NullPool)
+
+
+def main():
+    with Session(migration_engine()) as db:
+        for migration in MIGRATIONS:
+            logging.info(f"{migration.__name__}: {migration(db)} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,186 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.core.config import settings
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL)
+
+class PoolMetrics:
+    """Checkout wait times and timeouts of one connection pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+
+def timed_pool_class(metrics: PoolMetrics) -> type:
+    # A subclass rather than an instance attribute, so pools recreated by engine.dispose() keep reporting
+    class TimedQueuePool(QueuePool):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except exc.TimeoutError:
+                metrics.record_timeout()
+                raise
+            metrics.record_wait(time.perf_counter() - start)
+            return connection
+
+    return TimedQueuePool
+
+
+def is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def uses_queue_pool(url: str, is_async: bool = False) -> bool:
+    # The pool SQLAlchemy picks for this URL; aiosqlite on a file, for one, gets a NullPool
+    parsed = make_url(url)
+    return issubclass(parsed.get_dialect(_is_async=is_async).get_pool_class(parsed), QueuePool)
+
+
+def engine_options(url: str, pool_size: int, max_overflow: int, is_async: bool = False) -> Dict:
+    """Keyword arguments for create_engine / create_async_engine from the DB_* settings."""
+    if is_memory_sqlite(url):
+        # In-memory SQLite lives and dies with its single connection: keep SQLAlchemy's default pool
+        return {}
+    options = {
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    # Sizing only means something to a QueuePool; other pools reject these arguments
+    if uses_queue_pool(url, is_async):
+        options.update({
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+        })
+    # psycopg2 runs an UPDATE executemany (grading results) as one statement per row unless
+    # batched; values_plus_batch sends them in pages with execute_batch
+    if make_url(url).get_driver_name() == "psycopg2":
+        options["executemany_mode"] = "values_plus_batch"
+    timeout = settings.DB_STATEMENT_TIMEOUT_MS
+    if timeout > 0 and make_url(url).get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+engines: Dict[str, Engine] = {}
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def create_db_engine(name: str, url: str, pool_size: int, max_overflow: int) -> Engine:
+    options = engine_options(url, pool_size, max_overflow)
+    metrics = pool_metrics[name] = PoolMetrics()
+    if "pool_size" in options:
+        options["poolclass"] = timed_pool_class(metrics)
+    engines[name] = create_engine(url, **options)
+    return engines[name]
+
+
+def pool_stats() -> Dict[str, Dict]:
+    stats = {}
+    pools = {name: engine.pool for name, engine in engines.items()}
+    if async_engine is not None:
+        pools["async"] = async_engine.sync_engine.pool
+    for name, pool in pools.items():
+        entry = {}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                # QueuePool counts overflow from -pool_size until the pool is full
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        metrics = pool_metrics.get(name)
+        if metrics is not None:
+            entry.update({
+                "checkouts": metrics.checkouts,
+                "timeouts": metrics.timeouts,
+                "wait_seconds_total": metrics.wait_seconds_total,
+                "wait_seconds_max": metrics.wait_seconds_max,
+            })
+        stats[name] = entry
+    return stats
+
+
+engine = create_db_engine("api", DATABASE_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The queue consumers get their own pool so a grading burst can't exhaust the API's connections
+worker_engine = (
+    engine if is_memory_sqlite(DATABASE_URL)
+    else create_db_engine("worker", DATABASE_URL, settings.WORKER_DB_POOL_SIZE, settings.WORKER_DB_MAX_OVERFLOW)
+)
+WorkerSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=worker_engine)
 Base = declarative_base()
 
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or to_async_url(DATABASE_URL)
+
+# The async engine is only built when used, so the asyncpg / aiosqlite drivers stay optional
+async_engine = None
+AsyncSessionLocal = None
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            **engine_options(ASYNC_DATABASE_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, is_async=True),
+        )
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_session_factory() -> sessionmaker:
+    # For responses that outlive the request's dependencies (streaming), which open their own session
+    return SessionLocal
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+# Session used by the read endpoints, chosen by ASYNC_DB_ENABLED
+get_read_db = get_async_db if settings.ASYNC_DB_ENABLED else get_db
@@ -1,24 +1,44 @@
-import json
-import boto3
+import asyncio
 import os
 import logging
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, Response
 from starlette.middleware.sessions import SessionMiddleware 
 from app.routers import application
+from app.routers.application import NEXT_CURSOR_HEADER
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlmodel import SQLModel 
-from app.db.session import engine
+from sqlmodel import SQLModel, Session
+from app.crud import crud_summary
+from app.db.migrations import migration_engine
+from app.db.session import engine, pool_stats
 from app.core.config import settings
-from apscheduler.schedulers.background import BackgroundScheduler
+from app.core.events import PostgresListener
+from app.core.metrics import MetricsMiddleware, render
+from app.worker import build_consumers
 logging.basicConfig(level=logging.INFO)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup event
     SQLModel.metadata.create_all(engine)
+    # The summary table is kept incrementally: build it once if this database predates it
+    with Session(migration_engine()) as db:
+        if backfilled := crud_summary.backfill_if_empty(db):
+            logging.info(f"Backfilled {backfilled} scholarship summary rows")
+    # Queue consumers start with the app instead of at import time, and can be moved to app.worker
+    consumers = build_consumers() if settings.SQS_CONSUMERS_ENABLED else []
+    # With several workers, status events reach every worker's clients through LISTEN/NOTIFY
+    if settings.STATUS_EVENTS_BACKEND == "postgres":
+        consumers.append(PostgresListener(settings.DATABASE_URL))
+    for consumer in consumers:
+        consumer.start()
     yield
+    # Shutdown event: finish in-flight messages without blocking the event loop
+    for consumer in consumers:
+        consumer.stop()
+    for consumer in consumers:
+        await asyncio.to_thread(consumer.join)
 
 app = FastAPI(swagger_ui_parameters={"syntaxHighlight": True}, lifespan=lifespan)
 
@@ -32,12 +52,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 
+# Outermost, so the latency includes the other middlewares
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(application.router, prefix="/applications", tags=["applications"])
 
+@app.get("/health/db", tags=["health"])
+def database_health():
+    # Per-pool size, in-use connections, overflow and checkout wait times
+    return pool_stats()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
 APPLICATION_FILES_DIR = os.getenv("APPLICATION_FILES_DIR", "application_files")
 os.makedirs(APPLICATION_FILES_DIR, exist_ok=True)
 
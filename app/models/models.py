@@ -1,6 +1,8 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
 from datetime import datetime
+from sqlalchemy import DateTime, Index, Text
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.sql import func
 from enum import Enum
 
@@ -15,11 +17,26 @@ class UserResponse(str, Enum):
     reject = "Declined"
 
 class Application(SQLModel, table=True):
+    # Listings page by (created_at, id) within a user or a scholarship
+    __table_args__ = (
+        Index("ix_application_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_application_scholarship_id_created_at_id", "scholarship_id", "created_at", "id"),
+        Index("ix_application_scholarship_id_status_created_at_id", "scholarship_id", "status", "created_at", "id"),
+        # Grade statistics and ranking per scholarship
+        Index("ix_application_scholarship_id_grade", "scholarship_id", "grade"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True, index=True)
     user_id: str = Field(nullable=False)
     scholarship_id: int = Field(nullable=False)
     name: str = Field(nullable=False)
-    created_at: datetime = Field(default=func.now(), nullable=False)
+    # SQLite's CURRENT_TIMESTAMP has no microseconds; store bound values the same way so
+    # cursor comparisons on created_at match rows inserted by func.now()
+    created_at: datetime = Field(
+        default=func.now(),
+        nullable=False,
+        sa_type=DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite"),
+    )
     status: ApplicationStatus = Field(nullable=False, default=ApplicationStatus.submitted)
     user_response: Optional[UserResponse] = Field(default=None)
     grade: Optional[float] = Field(default=None, nullable=True)
@@ -31,8 +48,45 @@ class Application(SQLModel, table=True):
 class DocumentTemplate(SQLModel, table=True):
 
     id:  Optional[int] = Field(default=None, primary_key=True, index=True)
-    application_id: Optional[int] = Field(foreign_key="application.id")
+    application_id: Optional[int] = Field(foreign_key="application.id", index=True)
     name: str = Field(nullable=False)
     file_path: str = Field(nullable=False)
+    # Of the stored object; unknown for documents uploaded before content-addressed keys
+    sha256: Optional[str] = Field(default=None, nullable=True)
+    size: Optional[int] = Field(default=None, nullable=True)
     
     application: Optional[Application] = Relationship(back_populates="documents")
+
+class ScholarshipSummary(SQLModel, table=True):
+    # Per scholarship and status counters, kept up to date by app.crud in the same transaction
+    # as the application changes; app.crud.crud_summary.rebuild_summaries recomputes them
+    scholarship_id: int = Field(primary_key=True)
+    status: ApplicationStatus = Field(primary_key=True)
+    application_count: int = Field(default=0, nullable=False)
+    selected_count: int = Field(default=0, nullable=False)
+    graded_count: int = Field(default=0, nullable=False)
+    grade_sum: float = Field(default=0.0, nullable=False)
+
+class ProcessedMessage(SQLModel, table=True):
+    # Ledger of queue messages already applied, so redeliveries and duplicate sends are skipped
+    key: str = Field(primary_key=True)
+    message_id: Optional[str] = Field(default=None, nullable=True)
+    # Indexed for the retention sweep (app.consumers.ledger.purge)
+    created_at: datetime = Field(default=func.now(), nullable=False, index=True)
+
+class OutboxMessage(SQLModel, table=True):
+    # SQS messages committed in the same transaction as the change that produced them;
+    # app.consumers.outbox.OutboxRelay sends them and deletes the row
+    __table_args__ = (Index("ix_outboxmessage_available_at_id", "available_at", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    queue_url: str = Field(nullable=False)
+    body: str = Field(nullable=False, sa_type=Text)
+    # MessageAttributes as JSON
+    attributes: Optional[str] = Field(default=None, nullable=True, sa_type=Text)
+    group_id: Optional[str] = Field(default=None, nullable=True)
+    deduplication_id: Optional[str] = Field(default=None, nullable=True)
+    attempts: int = Field(default=0, nullable=False)
+    # Epoch seconds before which the relay leaves the row alone (retry backoff)
+    available_at: float = Field(nullable=False)
+    created_at: datetime = Field(default=func.now(), nullable=False)
@@ -1,47 +1,46 @@
-from typing import List, Dict, Annotated
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from typing import List, Dict, Annotated, Awaitable, Callable, Literal, Optional, Union
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session, joinedload
-from apscheduler.schedulers.background import BackgroundScheduler
-from app.db.session import get_db
-from app.models import models
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from botocore.exceptions import ClientError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from app.db.session import get_db, get_read_db, get_session_factory
 from app.schemas import schemas
-from app.crud import crud_application
+from app.crud import crud_application, crud_summary
 from app.core.config import settings
+from app.core.cache import CachedResponse, application_cache
+from app.core.events import status_bus
+from app.core.jwks import decode_token
+from app.core.presign import presigned_url
+from app.core import serialization
+from pydantic import TypeAdapter, ValidationError
+import asyncio
 import jwt
-from jwt import PyJWKClient
-import os
-import boto3
+import csv
+import io
 import json
-import logging
 
 router = APIRouter()
 
 oauth2_scheme = HTTPBearer()
 
-DEADLINE_QUEUE_URL = str(os.getenv("DEADLINE_QUEUE_URL"))
-TO_GRADING_QUEUE_URL = str(os.getenv("TO_GRADING_QUEUE_URL"))
-APP_GRADING_QUEUE_URL = str(os.getenv("APP_GRADING_QUEUE_URL"))
-AWS_ACESS_KEY_ID = str(os.getenv("AWS_ACCESS_KEY_ID"))
-AWS_SECRET_ACCESS_KEY = str(os.getenv("AWS_SECRET_ACCESS_KEY"))
-REGION = str(os.getenv("REGION"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)):
     token = credentials.credentials
     try:
-        # Fetch public keys from AWS Cognito
-        jwks_client = PyJWKClient(settings.COGNITO_KEYS_URL)
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
-
-        # Decode and validate the token
-        payload = jwt.decode(token, signing_key.key, algorithms=["RS256"])
-        return payload
+        # Public keys and recently verified tokens are cached process-wide
+        return decode_token(token)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 TokenDep = Annotated[Dict, Depends(verify_token)]
+# AsyncSession when ASYNC_DB_ENABLED, otherwise a sync Session used from the threadpool
+ReadDbDep = Annotated[Union[Session, AsyncSession], Depends(get_read_db)]
 
 @router.get("/health")
 def health_check():
@@ -69,137 +68,336 @@ async def create_application(
         # Handle documents separately
     )
 
-    # Create the application record
-    db_application = crud_application.create_application(db, application)
+    documents = document_file or []
+    names = [crud_application.get_filename_without_extension(document) for document in documents]
+    if not all(names):
+        raise HTTPException(status_code=400, detail="Document name could not be determined")
+
+    # Upload the documents concurrently, then create the application and its documents in one commit
+    namespace = crud_application.document_namespace(scholarship_id, user_id)
+    stored = await crud_application.save_files(documents, namespace)
+    return await run_in_threadpool(
+        crud_application.create_application_with_documents, db, application, list(zip(names, stored))
+    )
+
+BULK_ITEM = TypeAdapter(schemas.BulkApplicationCreate)
 
-    # Create the document records
-    for document in  enumerate(document_file or []):
-        await crud_application.create_application_document(db, db_application.id, document[1])
+def validate_bulk_items(items: List[Dict], filenames: Optional[set] = None):
+    # Returns the valid items with their index, and an error result for each invalid one.
+    # JSON submissions reference documents by S3 key; multipart ones may also name an uploaded file.
+    if len(items) > settings.BULK_SUBMIT_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BULK_SUBMIT_MAX_ITEMS} applications per request")
+    valid, invalid = [], []
+    for index, item in enumerate(items):
+        try:
+            application = BULK_ITEM.validate_python(item)
+        except ValidationError as e:
+            invalid.append(schemas.BulkItemResult(
+                index=index, errors=[f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()]
+            ))
+            continue
+        errors = []
+        for position, document in enumerate(application.documents):
+            if (document.key is None) == (document.file is None):
+                errors.append(f"documents.{position}: exactly one of key and file is required")
+            elif document.file is not None and document.file not in (filenames or ()):
+                errors.append(f"documents.{position}: no uploaded file named {document.file!r}")
+            # Only the server fills these in
+            document.sha256 = document.size = None
+        if errors:
+            invalid.append(schemas.BulkItemResult(index=index, errors=errors))
+        else:
+            valid.append((index, application))
+    return valid, invalid
+
+async def check_document_keys(valid, invalid):
+    # A key must be in the applicant's own namespace and the object must exist; its size is
+    # read from S3, never taken from the caller. Each namespace is listed once rather than each
+    # key HEAD'ed; if listing is not allowed, its keys are checked one HEAD at a time.
+    semaphore = asyncio.Semaphore(settings.S3_CHECK_CONCURRENCY)
+    listings: Dict[str, asyncio.Task] = {}
 
-    return db_application
+    async def list_prefix(prefix) -> Optional[Dict[str, int]]:
+        try:
+            async with semaphore:
+                return await run_in_threadpool(crud_application.object_sizes, prefix)
+        except ClientError:
+            return None
+
+    async def check(application, document) -> Optional[str]:
+        prefix = crud_application.document_prefix(
+            crud_application.document_namespace(application.scholarship_id, application.user_id)
+        )
+        if not document.key.startswith(prefix) or ".." in document.key.split("/"):
+            return f"key must start with {prefix!r}"
+        if prefix not in listings:
+            listings[prefix] = asyncio.ensure_future(list_prefix(prefix))
+        sizes = await listings[prefix]
+        if sizes is not None:
+            size = sizes.get(document.key)
+        else:
+            try:
+                async with semaphore:
+                    size = await run_in_threadpool(crud_application.object_size, document.key)
+            except ClientError as e:
+                return f"could not check {document.key!r}: {e.response.get('Error', {}).get('Code')}"
+        if size is None:
+            return f"no document at {document.key!r}"
+        document.size = size
+        return None
+
+    checks = [
+        [check(application, document) for document in application.documents if document.key is not None]
+        for _, application in valid
+    ]
+    errors = await asyncio.gather(*(asyncio.gather(*item_checks) for item_checks in checks))
+    checked = []
+    for (index, application), item_errors in zip(valid, errors):
+        positions = [position for position, document in enumerate(application.documents) if document.key is not None]
+        item_errors = [f"documents.{position}: {error}" for position, error in zip(positions, item_errors) if error]
+        if item_errors:
+            invalid.append(schemas.BulkItemResult(index=index, errors=item_errors))
+        else:
+            checked.append((index, application))
+    return checked, invalid
+
+async def create_bulk(db: Session, valid, invalid) -> schemas.BulkSubmissionResult:
+    ids = await run_in_threadpool(crud_application.bulk_create_applications, db, [application for _, application in valid])
+    results = invalid + [schemas.BulkItemResult(index=index, id=application_id) for (index, _), application_id in zip(valid, ids)]
+    return schemas.BulkSubmissionResult(
+        created=len(ids), failed=len(invalid), results=sorted(results, key=lambda result: result.index)
+    )
+
+@router.post("/submit/bulk", response_model=schemas.BulkSubmissionResult)
+async def create_applications_bulk(_: TokenDep, submission: schemas.BulkSubmission, db: Session = Depends(get_db)):
+    # For partners submitting many applications whose documents are already in S3. Valid items
+    # are created in one transaction; invalid ones are reported per index and skipped.
+    return await create_bulk(db, *await check_document_keys(*validate_bulk_items(submission.applications)))
+
+@router.post("/submit/bulk/multipart", response_model=schemas.BulkSubmissionResult)
+async def create_applications_bulk_multipart(
+        _: TokenDep,
+        db: Session = Depends(get_db),
+        applications: str = Form(..., description="JSON array of applications; documents name an uploaded file"),
+        files: List[UploadFile] = File(None),
+    ):
+    try:
+        items = json.loads(applications)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="applications must be a JSON array")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="applications must be a JSON array")
+    uploads = {file.filename: file for file in files or [] if file.filename}
+    valid, invalid = await check_document_keys(*validate_bulk_items(items, set(uploads)))
+
+    # Only the files referenced by valid items are stored, once per applicant namespace; each
+    # file is hashed once and uploads already in S3 are skipped
+    namespaces: Dict[str, Dict[str, None]] = {}
+    for _, application in valid:
+        namespace = crud_application.document_namespace(application.scholarship_id, application.user_id)
+        for document in application.documents:
+            if document.file:
+                namespaces.setdefault(document.file, {})[namespace] = None
+    saved = await crud_application.save_files_to_namespaces(
+        [(uploads[filename], list(file_namespaces)) for filename, file_namespaces in namespaces.items()]
+    )
+    stored = {
+        (filename, namespace): file
+        for (filename, file_namespaces), files in zip(namespaces.items(), saved)
+        for namespace, file in zip(file_namespaces, files)
+    }
+    for _, application in valid:
+        namespace = crud_application.document_namespace(application.scholarship_id, application.user_id)
+        for document in application.documents:
+            if document.file:
+                document.key, document.sha256, document.size = stored[(document.file, namespace)]
+    return await create_bulk(db, valid, invalid)
+
+def presign_documents(record: Dict) -> Dict:
+    for document in record["documents"]:
+        document["file_path"] = presigned_url(document["file_path"])
+    return record
+
+async def fetch_page(db: Union[Session, AsyncSession], limit: int, **filters):
+    # Listings skip the ORM and Pydantic: rows of the needed columns become dicts in the
+    # ApplicationBase shape and are encoded with orjson
+    if isinstance(db, AsyncSession):
+        records, next_cursor = await crud_application.list_application_records_async(db, limit, **filters)
+    else:
+        records, next_cursor = await run_in_threadpool(crud_application.list_application_records, db, limit, **filters)
+    return [presign_documents(record) for record in records], next_cursor
+
+async def list_page(db: Union[Session, AsyncSession], limit: int, **filters) -> Response:
+    # The body stays a plain list; the cursor of the next page, if any, goes in X-Next-Cursor
+    records, next_cursor = await fetch_page(db, limit, **filters)
+    return serialization.FastJSONResponse(records, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+async def call_cache(function, *args):
+    # A remote cache backend does network I/O; keep it off the event loop
+    if application_cache.backend.blocking:
+        return await run_in_threadpool(function, *args)
+    return function(*args)
+
+async def cached_response(request: Request, key: str, load: Callable[[], Awaitable[CachedResponse]]) -> Response:
+    # Read-through: serve the serialized body from the cache, or load and store it. The ETag is a
+    # hash of the body, so an unchanged resource answers If-None-Match with 304 and no body.
+    cached = await call_cache(application_cache.get, key)
+    if cached is None:
+        cached = await load()
+        await call_cache(application_cache.set, key, cached)
+    headers = {**cached.headers, "ETag": cached.etag}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or cached.etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
 
 @router.get("/", response_model=list[schemas.ApplicationBase])
-def get_applications(_: TokenDep, user_id: str, db: Session = Depends(get_db), skip: int = 0, limit: int = 100):
-    return crud_application.get_applications(db, user_id, skip, limit)
+async def get_applications(
+        _: TokenDep,
+        user_id: str,
+        db: ReadDbDep,
+        request: Request,
+        skip: int = 0,
+        limit: int = Query(100, ge=1, le=settings.MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        status: Optional[List[schemas.ApplicationStatus]] = Query(None),
+    ):
+    async def load() -> CachedResponse:
+        records, next_cursor = await fetch_page(db, limit, user_id=user_id, statuses=status, cursor=cursor, skip=skip)
+        return CachedResponse(serialization.dumps(records), {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {})
+
+    key = await call_cache(application_cache.listing_key, user_id, skip, limit, cursor, status)
+    return await cached_response(request, key, load)
 
 @router.get("/{application_id}/details", response_model=schemas.ApplicationBase)
-def get_application(_: TokenDep, application_id: int, db: Session = Depends(get_db)):
-    return crud_application.get_application(db, application_id)
+async def get_application(_: TokenDep, application_id: int, db: ReadDbDep, request: Request):
+    async def load() -> CachedResponse:
+        if isinstance(db, AsyncSession):
+            application = await crud_application.get_application_async(db, application_id)
+        else:
+            application = await run_in_threadpool(crud_application.get_application, db, application_id)
+        if application is None:
+            raise HTTPException(status_code=404, detail="Application not found")
+        return CachedResponse(schemas.ApplicationBase.model_validate(application, from_attributes=True).model_dump_json().encode())
+
+    return await cached_response(request, await call_cache(application_cache.details_key, application_id), load)
+
+@router.get("/events", response_model=schemas.StatusEvents)
+async def poll_status_events(
+        _: TokenDep,
+        user_id: str,
+        since: Optional[str] = None,
+        timeout: float = Query(settings.STATUS_EVENTS_TIMEOUT, ge=0, le=settings.STATUS_EVENTS_TIMEOUT),
+    ):
+    # Long-poll on the in-process bus: no DB query while waiting. Without since it answers
+    # right away with the version to pass next time; call it before loading the listing.
+    events, version, reset = await status_bus.wait(user_id, since, timeout)
+    return {"version": version, "reset": reset, "events": events}
+
+def sse_message(event: str, version: str, data: Dict) -> str:
+    return f"id: {version}\nevent: {event}\ndata: {serialization.dumps(data).decode()}\n\n"
+
+async def status_event_stream(request: Request, user_id: str, since: Optional[str]):
+    if since is None:
+        since = status_bus.version()
+        yield sse_message("ready", since, {"version": since})
+    while not await request.is_disconnected():
+        events, version, reset = await status_bus.wait(user_id, since, settings.STATUS_EVENTS_KEEPALIVE)
+        if reset:
+            yield sse_message("reset", version, {"version": version})
+        for status_event in events:
+            yield sse_message("status", status_event["version"], status_event)
+        if not events and not reset:
+            # Keeps proxies from closing an idle stream
+            yield ": keepalive\n\n"
+        since = version
+
+@router.get("/events/stream")
+async def stream_status_events(_: TokenDep, request: Request, user_id: str, since: Optional[str] = None):
+    # Server-sent events; EventSource sends the last id back as Last-Event-ID when it reconnects
+    return StreamingResponse(
+        status_event_stream(request, user_id, request.headers.get("last-event-id") or since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 #@router.put("/{application_id}/status", response_model=schemas.ApplicationBase)
 def update_application_status(application_id: int, status: schemas.ApplicationStatus, grade: float, reason: str, db: Session = Depends(get_db)):
     return crud_application.update_application_status(db, application_id, status, grade, reason)
 
 @router.get("/scholarship/{scholarship_id}", response_model=List[schemas.ApplicationBase])
-def get_applications_by_scholarship(_: TokenDep, scholarship_id: int, db: Session = Depends(get_db)):
-    return crud_application.get_applications_by_scholarship(db, scholarship_id)
-
-### SQS HANDLING ###
-
-sqs = boto3.client(
-    'sqs',
-    region_name=REGION
-)
-def process_message(message):
-    notification = json.loads(message['Body'])
-    # Use joinedload to eagerly load the documents relationship
-    db = next(get_db())
-    applications = (
-        db.query(models.Application)
-        .options(joinedload(models.Application.documents))
-        .filter(models.Application.scholarship_id == notification["scholarship_id"])
-        .all()
-    )
-    
-    for application in applications:
-        crud_application.update_application_status(
-            db, 
-            application.id, 
-            schemas.ApplicationStatus.under_evaluation
-        )
+async def get_applications_by_scholarship(
+        _: TokenDep,
+        scholarship_id: int,
+        db: ReadDbDep,
+        limit: int = Query(100, ge=1, le=settings.MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        status: Optional[List[schemas.ApplicationStatus]] = Query(None),
+    ):
+    return await list_page(db, limit, scholarship_id=scholarship_id, statuses=status, cursor=cursor)
 
-    logging.info(f"Applications under evaluation: {applications}")
-
-    # Convert applications to dict with documents included
-    applications_data = []
-    for application in applications:
-        app_dict = application.model_dump()
-        # Convert documents to dict format
-        documents_data = []
-        for doc in application.documents:
-            doc_dict = {
-                "id": doc.id,
-                "name": doc.name,
-                "file_path": doc.file_path
-            }
-            documents_data.append(doc_dict)
-        
-        # Remove unwanted attributes and add documents
-        app_dict.pop("status")
-        app_dict["created_at"] = app_dict["created_at"].isoformat()
-        app_dict["documents"] = documents_data
-        applications_data.append(app_dict)
-
-    logging.info(f"Applications to be graded: {applications_data}")
-
-    message = {
-        "applications": applications_data,
-        "scholarship_id": notification["scholarship_id"],
-        "jury_ids": notification["jury_ids"],
-        "spots": notification["spots"],
-        "closed_at": notification["closed_at"]
+@router.get("/scholarship/{scholarship_id}/aggregates", response_model=schemas.ScholarshipAggregates)
+def get_scholarship_aggregates(
+        _: TokenDep,
+        scholarship_id: int,
+        db: Session = Depends(get_db),
+        top: int = Query(10, ge=0, le=settings.MAX_PAGE_SIZE),
+    ):
+    # Counts and the mean come from the summary table; the grade distribution and the ranking
+    # from the (scholarship_id, grade) index, and only if anything was graded
+    summary = crud_summary.get_summary(db, scholarship_id)
+    grades = {"count": summary["graded"], "mean": summary["mean"]}
+    ranking = []
+    if summary["graded"]:
+        grades.update(crud_summary.grade_distribution(db, scholarship_id))
+        ranking = crud_summary.top_ranked(db, scholarship_id, top) if top else []
+    return {
+        "scholarship_id": scholarship_id,
+        "total": summary["total"],
+        "by_status": summary["by_status"],
+        "selected": summary["selected"],
+        "grades": grades,
+        "ranking": ranking,
     }
-    logging.info(f"Sending message to grading: {message}")
-    send_to_sqs(message)
-
-def process_message2(message):
-    # Add your message processing logic here
-    notification = json.loads(message['Body'])
-    for application in notification["applications"]:
-        application_id = application['application_id']
-        status = application['status']
-        grade = application['grade']
-        reason = application['reason']
-        #### THE WINNER MUST HAVE FLAG SELECTED SET TO TRUE 
-        if(status == "Accepted"):
-            status = schemas.ApplicationStatus.approved
-            crud_application.update_application_select(next(get_db()), application_id, True)
-        else:
-            status = schemas.ApplicationStatus.rejected
-            crud_application.update_application_select(next(get_db()), application_id, False)
-        crud_application.update_application_status(next(get_db()), application_id, status, grade, reason)
-        logging.info(f"Updated application {application_id} status to {status} with grade {grade}, reason: {reason}") 
-    
-def send_to_sqs(message: dict):
-    response = sqs.send_message(
-        QueueUrl=TO_GRADING_QUEUE_URL,
-        MessageBody=json.dumps(message),
-    )
-    print(f"Message sent to SQS: {response['MessageId']}")
-    return response
-
-def receive_message(queue_url):
-    response = sqs.receive_message(
-        QueueUrl=queue_url,
-        MaxNumberOfMessages=1,
-        WaitTimeSeconds=5,
-    )
-    messages = response.get('Messages', [])
-    for message in messages:
-        body = json.loads(message['Body'])
-        logging.info(f"Received message: {body}")
-        if queue_url == DEADLINE_QUEUE_URL:
-            process_message(message)
-        if queue_url == APP_GRADING_QUEUE_URL:
-            process_message2(message)
-        # Delete the message from the queue
-        sqs.delete_message(
-            QueueUrl=queue_url,
-            ReceiptHandle=message['ReceiptHandle']
-        )
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(receive_message, 'interval', seconds=2, max_instances=10, args=[DEADLINE_QUEUE_URL])
-scheduler.add_job(receive_message, 'interval', seconds=2, max_instances=10, args=[APP_GRADING_QUEUE_URL])
-logging.getLogger('apscheduler.executors.default').setLevel(logging.WARNING)
-scheduler.start()
+def export_record(application: Dict) -> Dict:
+    application["status"] = application["status"].value
+    application["created_at"] = application["created_at"].isoformat()
+    if application["user_response"] is not None:
+        application["user_response"] = application["user_response"].value
+    return presign_documents(application)
+
+def export_chunks(session_factory: sessionmaker, scholarship_id: int, export_format: str, rows_per_chunk: int = 500):
+    # Runs in the threadpool while the response streams, with its own session: the request's
+    # dependencies are already closed by then. Rows are grouped so each chunk isn't a single line.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(crud_application.EXPORT_COLUMNS + ["documents"])
+    with session_factory() as db:
+        for count, application in enumerate(crud_application.iter_applications_for_export(db, scholarship_id), 1):
+            record = export_record(application)
+            if export_format == "csv":
+                writer.writerow([record[column] for column in crud_application.EXPORT_COLUMNS] + [serialization.dumps(record["documents"]).decode()])
+            else:
+                buffer.write(serialization.dumps(record).decode() + "\n")
+            if count % rows_per_chunk == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+@router.get("/scholarship/{scholarship_id}/export")
+def export_applications_by_scholarship(
+        _: TokenDep,
+        scholarship_id: int,
+        session_factory: Annotated[sessionmaker, Depends(get_session_factory)],
+        format: Literal["ndjson", "csv"] = "ndjson",
+    ):
+    return StreamingResponse(
+        export_chunks(session_factory, scholarship_id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="scholarship-{scholarship_id}-applications.{format}"'},
+    )
@@ -1,13 +1,20 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, field_serializer
+from pydantic.json_schema import SkipJsonSchema
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel
+from app.core.presign import presigned_url
 
 class DocumentTemplateBase(BaseModel):
     name: str
     file_path: str
 
+    # file_path is stored as an S3 key and handed out as a freshly presigned URL
+    @field_serializer("file_path")
+    def serialize_file_path(self, file_path: str) -> str:
+        return presigned_url(file_path)
+
 class DocumentTemplateCreate(DocumentTemplateBase):
     pass
 
@@ -41,3 +48,72 @@ class ApplicationBase(BaseModel):
     user_response: Optional[UserResponse] = None
     grade: Optional[float] = None 
     select: bool = False
+
+class BulkDocument(BaseModel):
+    name: str = Field(min_length=1)
+    # S3 key of an already uploaded document, or, in a multipart submission, the filename of one of the uploaded files
+    key: Optional[str] = Field(default=None, min_length=1)
+    file: Optional[str] = Field(default=None, min_length=1)
+    # Filled in by the server, from the upload or from S3 for a key; values sent by the caller are ignored
+    sha256: SkipJsonSchema[Optional[str]] = None
+    size: SkipJsonSchema[Optional[int]] = None
+
+class BulkApplicationCreate(BaseModel):
+    scholarship_id: int
+    user_id: str = Field(min_length=1)
+    name: str = Field(min_length=1)
+    documents: List[BulkDocument] = []
+
+class BulkSubmission(BaseModel):
+    # Items are validated one by one, so an invalid item is reported without failing the others
+    applications: List[Dict[str, Any]]
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    errors: List[str] = []
+
+class BulkSubmissionResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkItemResult]
+
+class StatusEvent(BaseModel):
+    # Pass the version back as `since` (or Last-Event-ID) to resume after this event
+    version: str
+    application_id: int
+    user_id: str
+    scholarship_id: int
+    status: ApplicationStatus
+    select: bool
+
+class StatusEvents(BaseModel):
+    version: str
+    # The version couldn't be resumed from (another worker, or too old): refetch the applications
+    reset: bool = False
+    events: List[StatusEvent]
+
+class GradeStatistics(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    # Nearest-rank percentiles, e.g. {"p50": 14.5}
+    percentiles: Dict[str, Optional[float]] = {}
+
+class RankedApplication(BaseModel):
+    rank: int
+    id: int
+    user_id: str
+    name: str
+    status: ApplicationStatus
+    grade: float
+    select: bool
+
+class ScholarshipAggregates(BaseModel):
+    scholarship_id: int
+    total: int
+    by_status: Dict[ApplicationStatus, int]
+    selected: int
+    grades: GradeStatistics
+    ranking: List[RankedApplication]
@@ -0,0 +1,76 @@
+"""Standalone SQS consumer process.
+
+    python -m app.worker
+
+Runs one QueueConsumer per queue in app.consumers.handlers, and the outbox relay
+that sends what they produce, until SIGTERM or SIGINT, then finishes the messages
+already in flight and exits. Use this with SQS_CONSUMERS_ENABLED=false on the API
+so only this process consumes.
+"""
+import logging
+import signal
+import threading
+from typing import List, Union
+
+from app.consumers.consumer import QueueConsumer
+from app.consumers.handlers import get_queue_handlers
+from app.consumers.outbox import OutboxRelay
+from app.core.aws import get_sqs_client
+from app.core.config import settings
+from app.db.session import WorkerSessionLocal
+
+logging.basicConfig(level=logging.INFO)
+
+
+def build_consumers(sqs_client=None) -> List[Union[QueueConsumer, OutboxRelay]]:
+    queue_handlers = get_queue_handlers()
+    if not queue_handlers:
+        return []
+    sqs_client = sqs_client or get_sqs_client()
+    consumers: List[Union[QueueConsumer, OutboxRelay]] = [
+        QueueConsumer(
+            sqs_client,
+            queue_url,
+            handler,
+            max_workers=settings.SQS_WORKER_THREADS,
+            max_in_flight=settings.SQS_MAX_IN_FLIGHT,
+            max_messages=settings.SQS_MAX_MESSAGES,
+            wait_time_seconds=settings.SQS_WAIT_TIME_SECONDS,
+            visibility_timeout=settings.SQS_VISIBILITY_TIMEOUT,
+        )
+        for queue_url, handler in queue_handlers.items()
+    ]
+    # Rows left in the outbox at shutdown are sent by the next relay to start
+    consumers.append(OutboxRelay(
+        WorkerSessionLocal,
+        sqs_client,
+        batch_size=settings.OUTBOX_BATCH_SIZE,
+        poll_interval=settings.OUTBOX_POLL_INTERVAL,
+        retention_days=settings.LEDGER_RETENTION_DAYS,
+        purge_interval=settings.LEDGER_PURGE_INTERVAL,
+    ))
+    return consumers
+
+def main():
+    consumers = build_consumers()
+    stopped = threading.Event()
+
+    def shutdown(signum, frame):
+        logging.info(f"Received signal {signum}, stopping consumers")
+        stopped.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for consumer in consumers:
+        consumer.start()
+    while not stopped.wait(1):
+        pass
+    for consumer in consumers:
+        consumer.stop()
+    for consumer in consumers:
+        consumer.join()
+
+
+if __name__ == "__main__":
+    main()
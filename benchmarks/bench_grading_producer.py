@@ -0,0 +1,82 @@
+"""Throughput and peak memory of sending a scholarship to grading.
+
+    python -m benchmarks.bench_grading_producer --applications 10000
+
+Compares the old single json.dumps message (which SQS rejects above 256KB) with the path the
+deadline handler takes: build_grading_entries into the outbox, sent by an OutboxRelay, against
+an in-memory SQLite outbox and the SQS stand-in.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+from app.consumers import outbox
+from app.consumers.outbox import OutboxRelay
+from app.consumers.producer import SQS_MAX_MESSAGE_BYTES, build_grading_entries
+from app.core import aws
+from tests.fakes import FakeSQS
+
+QUEUE_URL = "https://sqs.local/000000000000/to-grading"
+HEADER = {"scholarship_id": 1, "jury_ids": ["j1", "j2"], "spots": 3, "closed_at": "2024-06-01T00:00:00"}
+
+
+def applications(count, documents):
+    for i in range(count):
+        yield {
+            "id": i, "user_id": f"user-{i}", "scholarship_id": 1, "name": f"Applicant {i}",
+            "created_at": "2024-05-01T12:00:00", "grade": None, "reason": None, "select": False,
+            "documents": [
+                {"id": i * 10 + j, "name": f"doc-{j}", "file_path": f"https://bucket.s3.amazonaws.com/{i}/{j}.pdf?X-Amz-Signature={'0' * 64}"}
+                for j in range(documents)
+            ],
+        }
+
+
+def measure(name, function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>14}: {elapsed:.3f}s, peak {peak / 1024 / 1024:.1f}MB, {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--applications", type=int, default=10000)
+    parser.add_argument("--documents", type=int, default=3)
+    args = parser.parse_args()
+
+    sqs = FakeSQS()
+    aws.set_client("sqs", sqs)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    def single_message():
+        body = json.dumps({"applications": list(applications(args.applications, args.documents)), **HEADER})
+        accepted = len(body.encode()) <= SQS_MAX_MESSAGE_BYTES
+        return f"1 message of {len(body) / 1024:.0f}KB ({'accepted' if accepted else 'rejected by SQS'})"
+
+    def chunked():
+        entries = build_grading_entries(HEADER, applications(args.applications, args.documents), QUEUE_URL, "bench")
+        with Session() as db:
+            outbox.enqueue(db, QUEUE_URL, entries)
+            db.commit()
+        relay = OutboxRelay(Session, sqs, batch_size=len(entries))
+        relay.run_once()
+        return f"{relay.sent} chunks in {sqs.count('send_message_batch')} send_message_batch calls"
+
+    measure("single message", single_message)
+    measure("chunked", chunked)
+
+
+if __name__ == "__main__":
+    main()
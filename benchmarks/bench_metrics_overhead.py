@@ -0,0 +1,77 @@
+"""Overhead of the metrics instrumentation on the hot paths.
+
+    python -m benchmarks.bench_metrics_overhead --calls 100000
+
+Times a no-op function with and without the timing decorator, and a minimal ASGI app with
+and without MetricsMiddleware. Exits non-zero when either exceeds OVERHEAD_BUDGET_US.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.core.metrics import DB_OPERATION_DURATION, MetricsMiddleware, timed
+
+# Per instrumented call / request; a CRUD call or request costs at least a few hundred microseconds
+OVERHEAD_BUDGET_US = 25
+
+
+def noop():
+    return None
+
+
+async def asgi_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls
+
+
+def per_request(app, calls):
+    scope = {"type": "http", "method": "GET", "path": "/bench"}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    async def run():
+        start = time.perf_counter()
+        for _ in range(calls):
+            await app(dict(scope), receive, send)
+        return (time.perf_counter() - start) / calls
+
+    return asyncio.run(run())
+
+
+def measure_overhead(calls: int = 20000, repeat: int = 5) -> dict:
+    """Microseconds added per call by the decorator and per request by the middleware.
+    Best of ``repeat`` runs, like timeit, so a busy machine doesn't read as overhead."""
+    decorated = timed(DB_OPERATION_DURATION, operation="bench_noop")(noop)
+    middleware = MetricsMiddleware(asgi_app)
+    return {
+        "decorator_us": min(per_call(decorated, calls) - per_call(noop, calls) for _ in range(repeat)) * 1e6,
+        "middleware_us": min(per_request(middleware, calls) - per_request(asgi_app, calls) for _ in range(repeat)) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args()
+
+    overhead = measure_overhead(args.calls)
+    for name, value in overhead.items():
+        print(f"{name}: {value:.2f} (budget {OVERHEAD_BUDGET_US})")
+    if any(value > OVERHEAD_BUDGET_US for value in overhead.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Cost of presigning document URLs while serializing a list response.
+
+    python -m benchmarks.bench_presign --applications 100 --documents 5
+
+Uses a real boto3 S3 client with dummy credentials; signing is local, no request is sent.
+"""
+import argparse
+import os
+import time
+
+from app.core.aws import get_s3_client
+from app.core.presign import url_cache
+from app.schemas import schemas
+
+
+def build_response(applications, documents):
+    return [
+        schemas.ApplicationBase(
+            id=i, scholarship_id=1, user_id=f"user-{i}", name=f"Applicant {i}",
+            documents=[schemas.DocumentTemplateCreate(name=f"doc-{j}", file_path=f"{i}/doc-{j}.pdf") for j in range(documents)],
+        )
+        for i in range(applications)
+    ]
+
+
+def timed(response, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for application in response:
+            application.model_dump(mode="json")
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--applications", type=int, default=100)
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    response = build_response(args.applications, args.documents)
+    urls = args.applications * args.documents
+
+    # Client creation (and the boto3 import) is a one-off cost, keep it out of the numbers
+    get_s3_client()
+    url_cache.clear()
+    cold = timed(response, 1)
+    warm = timed(response, args.rounds)
+    print(f"{urls} URLs per response")
+    print(f"  cold cache: {cold * 1000:.1f}ms ({cold / urls * 1e6:.0f}us per URL)")
+    print(f"  warm cache: {warm * 1000:.1f}ms ({warm / urls * 1e6:.1f}us per URL)")
+
+
+if __name__ == "__main__":
+    main()
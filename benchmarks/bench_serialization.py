@@ -0,0 +1,110 @@
+"""Cost of building and encoding listing responses, per 10k rows.
+
+    python -m benchmarks.bench_serialization --rows 10000 --documents 2
+
+Compares the previous path (ORM objects -> ApplicationBase validation -> Pydantic JSON) with
+the one the listings use now (column rows -> dicts -> orjson), both for the whole read and for
+the encoding step alone. Both presign the document URLs, through the S3 stand-in in tests/fakes.py
+and the process-wide URL cache, as the endpoints do.
+"""
+import argparse
+import tempfile
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import selectinload, sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+from app.core import aws, serialization
+from app.crud import crud_application
+from app.models import models
+from app.routers.application import presign_documents
+from app.schemas import schemas
+from tests.fakes import FakeS3
+
+SCHOLARSHIP_ID = 1
+APPLICATION_LIST = TypeAdapter(List[schemas.ApplicationBase])
+
+
+def seed(engine, rows: int, documents: int) -> None:
+    with engine.begin() as connection:
+        ids = connection.execute(
+            insert(models.Application.__table__).returning(models.Application.__table__.c.id),
+            [{"user_id": f"user-{i}", "scholarship_id": SCHOLARSHIP_ID, "name": f"Applicant {i}", "grade": i % 20} for i in range(rows)],
+        ).scalars().all()
+        if documents:
+            connection.execute(insert(models.DocumentTemplate.__table__), [
+                {"application_id": application_id, "name": f"doc-{j}", "file_path": f"{application_id}/doc-{j}.pdf"}
+                for application_id in ids for j in range(documents)
+            ])
+
+
+def orm_page(db, limit: int) -> List[models.Application]:
+    # The previous listing query: ORM objects with their documents
+    return db.execute(
+        select(models.Application)
+        .options(selectinload(models.Application.documents))
+        .where(models.Application.scholarship_id == SCHOLARSHIP_ID)
+        .order_by(models.Application.created_at, models.Application.id)
+        .limit(limit)
+    ).scalars().all()
+
+
+def best(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--documents", type=int, default=2, help="Documents per application")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    seed(engine, args.rows, args.documents)
+    Session = sessionmaker(bind=engine)
+    aws.set_client("s3", FakeS3(tempfile.mkdtemp(prefix="bench-serialization-")))
+
+    def pydantic_read():
+        with Session() as db:
+            applications = orm_page(db, args.rows)
+            return APPLICATION_LIST.dump_json(APPLICATION_LIST.validate_python(applications, from_attributes=True))
+
+    def records_read():
+        with Session() as db:
+            records, _ = crud_application.list_application_records(db, args.rows, scholarship_id=SCHOLARSHIP_ID)
+            return serialization.dumps([presign_documents(record) for record in records])
+
+    with Session() as db:
+        applications = orm_page(db, args.rows)
+        records, _ = crud_application.list_application_records(db, args.rows, scholarship_id=SCHOLARSHIP_ID)
+        results = {
+            "read + encode, pydantic": best(pydantic_read, args.repeat),
+            "read + encode, orjson records": best(records_read, args.repeat),
+            "encode only, pydantic": best(
+                lambda: APPLICATION_LIST.dump_json(APPLICATION_LIST.validate_python(applications, from_attributes=True)), args.repeat
+            ),
+            # file_path is rewritten in place, so later rounds recover the key from the URL first: if anything, slower
+            "encode only, orjson records": best(
+                lambda: serialization.dumps([presign_documents(record) for record in records]), args.repeat
+            ),
+        }
+
+    scale = 10000 / args.rows * 1000
+    print(f"{'path':<32} {'ms / 10k rows':>14}")
+    for name, seconds in results.items():
+        print(f"{name:<32} {seconds * scale:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Peak memory and latency of a /submit-style upload: buffered + sequential vs streaming + concurrent.
+
+    python -m benchmarks.bench_upload --documents 5 --size-mb 10 --latency-ms 50
+
+S3 is a filesystem-backed stand-in (tests.fakes.FakeS3); --latency-ms adds a sleep
+to every S3 call to approximate the network round trip.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
+
+from app.core import aws
+from app.core.config import settings
+from app.core.presign import presigned_url
+from app.crud import crud_application
+from app.models import models
+from app.schemas import schemas
+from tests.fakes import SlowS3
+
+
+def make_uploads(directory, documents, size):
+    uploads = []
+    for i in range(documents):
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, dir=directory)
+        remaining = size
+        while remaining:
+            block = os.urandom(min(remaining, 1024 * 1024))
+            spooled.write(block)
+            remaining -= len(block)
+        spooled.seek(0)
+        uploads.append(UploadFile(spooled, filename=f"document-{i}.bin"))
+    return uploads
+
+
+def application(i):
+    return schemas.ApplicationBase(id=0, scholarship_id=1, user_id=f"user-{i}", name=f"Applicant {i}")
+
+
+async def buffered_sequential(db, uploads):
+    # What /submit did before: read each file into memory, put_object on the event loop,
+    # commit the application and then every document separately.
+    s3 = aws.get_s3_client()
+    db_application = crud_application.create_application(db, application(0))
+    for upload in uploads:
+        content = await upload.read()
+        s3.put_object(Bucket=settings.S3_BUCKET_NAME, Key=upload.filename, Body=content)
+        db.add(models.DocumentTemplate(application_id=db_application.id, name=upload.filename, file_path=presigned_url(upload.filename)))
+        db.commit()
+
+
+async def streaming_concurrent(db, uploads):
+    stored = await crud_application.save_files(uploads, crud_application.document_namespace(1, "user-1"))
+    names = [upload.filename for upload in uploads]
+    await run_in_threadpool(
+        crud_application.create_application_with_documents, db, application(1), list(zip(names, stored))
+    )
+
+
+async def with_loop_monitor(path, db, uploads):
+    # The longest gap between 10ms ticks is how long other requests on this worker would stall
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def tick():
+        nonlocal worst
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            worst = max(worst, time.perf_counter() - start - 0.01)
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(0)
+    await path(db, uploads)
+    done.set()
+    await ticker
+    return worst
+
+
+def measure(name, path, db, uploads):
+    tracemalloc.start()
+    start = time.perf_counter()
+    stall = asyncio.run(with_loop_monitor(path, db, uploads))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:>22}: {elapsed:.3f}s, peak Python memory {peak / 1024 / 1024:.1f}MB, "
+        f"longest event loop stall {stall * 1000:.0f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        aws.set_client("s3", SlowS3(os.path.join(directory, "s3"), args.latency_ms / 1000))
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        size = int(args.size_mb * 1024 * 1024)
+        for name, path in (("buffered, sequential", buffered_sequential), ("streaming, concurrent", streaming_concurrent)):
+            uploads = make_uploads(directory, args.documents, size)
+            with sessionmaker(bind=engine)() as db:
+                measure(name, path, db, uploads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Closed-loop HTTP load test: N concurrent clients hammer one endpoint.
+
+Start the API twice, once per mode, and run the same load against each:
+
+    ASYNC_DB_ENABLED=false uvicorn app.main:app --port 8001
+    python -m benchmarks.load_test --url "http://localhost:8001/applications/?user_id=u1" --token $TOKEN
+
+    ASYNC_DB_ENABLED=true uvicorn app.main:app --port 8001
+    python -m benchmarks.load_test --url "http://localhost:8001/applications/?user_id=u1" --token $TOKEN
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def run(url, total, concurrency, headers, client=None):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker(http):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await http.get(url, headers=headers)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    async with (client or httpx.AsyncClient(timeout=30)) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, errors, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--token", help="Cognito access token sent as a bearer token")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    print(json.dumps(asyncio.run(run(args.url, args.requests, args.concurrency, headers)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+
+# Keep the app's own engine in memory instead of creating todo.db in the working tree
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+
+@pytest.fixture(autouse=True)
+def clear_application_cache():
+    from app.core.cache import application_cache
+
+    application_cache.clear()
+    yield
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def api_client(session_factory):
+    from fastapi.testclient import TestClient
+    from app.db.session import get_db, get_session_factory
+    from app.main import app
+    from app.routers.application import verify_token
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[verify_token] = lambda: {"sub": "test-user"}
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def fake_s3(tmp_path):
+    from app.core import aws
+    from tests.fakes import FakeS3
+
+    previous = aws._clients.get("s3")
+    s3 = FakeS3(tmp_path / "s3")
+    aws.set_client("s3", s3)
+    yield s3
+    if previous is None:
+        aws._clients.pop("s3", None)
+    else:
+        aws.set_client("s3", previous)
+
+
+@pytest.fixture
+def fake_sqs():
+    from app.core import aws
+    from tests.fakes import FakeSQS
+
+    previous = aws._clients.get("sqs")
+    sqs = FakeSQS()
+    aws.set_client("sqs", sqs)
+    yield sqs
+    if previous is None:
+        aws._clients.pop("sqs", None)
+    else:
+        aws.set_client("sqs", previous)
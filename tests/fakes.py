@@ -0,0 +1,278 @@
+import hashlib
+import io
+import itertools
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from app.models import models
+
+GRADING_QUEUE_URL = "https://sqs.local/000000000000/to-grading"
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def seed_applications(db, scholarship_id, count, documents_per_application=1, status=models.ApplicationStatus.submitted):
+    applications = [
+        models.Application(user_id=f"user-{i}", scholarship_id=scholarship_id, name=f"Applicant {i}", status=status)
+        for i in range(count)
+    ]
+    db.add_all(applications)
+    db.flush()
+    for application in applications:
+        for j in range(documents_per_application):
+            db.add(models.DocumentTemplate(application_id=application.id, name=f"doc-{j}", file_path=f"key-{application.id}-{j}"))
+    db.commit()
+    return [application.id for application in applications]
+
+
+class FakeSQS:
+    """In-memory stand-in for the subset of the boto3 SQS client the service uses."""
+
+    def __init__(self, default_visibility_timeout=30):
+        self.default_visibility_timeout = default_visibility_timeout
+        self.queues = {}
+        self.calls = []
+        self._lock = threading.Condition()
+        self._ids = itertools.count(1)
+
+    def _queue(self, url):
+        return self.queues.setdefault(url, [])
+
+    def _record(self, name, **kwargs):
+        self.calls.append((name, kwargs))
+
+    def count(self, name):
+        return sum(1 for call, _ in self.calls if call == name)
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._record("send_message", QueueUrl=QueueUrl)
+        with self._lock:
+            message = {
+                "MessageId": str(uuid.uuid4()),
+                "Body": MessageBody,
+                "MD5OfBody": hashlib.md5(MessageBody.encode()).hexdigest(),
+                "MessageAttributes": kwargs.get("MessageAttributes", {}),
+                "visible_at": 0.0,
+                "receipt_handle": None,
+                "receive_count": 0,
+            }
+            self._queue(QueueUrl).append(message)
+            self._lock.notify_all()
+        return {"MessageId": message["MessageId"]}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        self._record("send_message_batch", QueueUrl=QueueUrl)
+        successful = []
+        for entry in Entries:
+            kwargs = {k: v for k, v in entry.items() if k not in ("Id", "MessageBody")}
+            response = self.send_message(QueueUrl, entry["MessageBody"], **kwargs)
+            self.calls.pop()
+            successful.append({"Id": entry["Id"], "MessageId": response["MessageId"]})
+        return {"Successful": successful, "Failed": []}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=None, **kwargs):
+        assert 1 <= MaxNumberOfMessages <= 10
+        self._record("receive_message", QueueUrl=QueueUrl, MaxNumberOfMessages=MaxNumberOfMessages)
+        visibility = self.default_visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                visible = [m for m in self._queue(QueueUrl) if m["visible_at"] <= now]
+                if visible or now >= deadline:
+                    break
+                self._lock.wait(min(deadline - now, 0.05))
+            messages = []
+            for message in visible[:MaxNumberOfMessages]:
+                message["visible_at"] = now + visibility
+                message["receipt_handle"] = f"{message['MessageId']}#{next(self._ids)}"
+                message["receive_count"] += 1
+                messages.append({
+                    "MessageId": message["MessageId"],
+                    "ReceiptHandle": message["receipt_handle"],
+                    "Body": message["Body"],
+                    "MD5OfBody": message["MD5OfBody"],
+                    "MessageAttributes": message["MessageAttributes"],
+                })
+        return {"Messages": messages} if messages else {}
+
+    def _find(self, QueueUrl, ReceiptHandle):
+        for message in self._queue(QueueUrl):
+            if message["receipt_handle"] == ReceiptHandle:
+                return message
+        return None
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self._record("delete_message", QueueUrl=QueueUrl)
+        with self._lock:
+            message = self._find(QueueUrl, ReceiptHandle)
+            if message is not None:
+                self._queue(QueueUrl).remove(message)
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        self._record("delete_message_batch", QueueUrl=QueueUrl, Entries=Entries)
+        with self._lock:
+            for entry in Entries:
+                message = self._find(QueueUrl, entry["ReceiptHandle"])
+                if message is not None:
+                    self._queue(QueueUrl).remove(message)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        self._record("change_message_visibility_batch", QueueUrl=QueueUrl, Entries=Entries)
+        now = time.monotonic()
+        with self._lock:
+            for entry in Entries:
+                message = self._find(QueueUrl, entry["ReceiptHandle"])
+                if message is not None:
+                    message["visible_at"] = now + entry["VisibilityTimeout"]
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def make_visible(self, QueueUrl):
+        """Expire every visibility timeout, as if the consumer had crashed."""
+        with self._lock:
+            for message in self._queue(QueueUrl):
+                message["visible_at"] = 0.0
+            self._lock.notify_all()
+
+    def pending(self, QueueUrl):
+        return len(self._queue(QueueUrl))
+
+
+class FakeS3:
+    """Filesystem-backed stand-in for the boto3 S3 client: objects are files under ``root``."""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.calls = []
+        self._uploads = {}
+        self._lock = threading.Lock()
+        # Without s3:ListBucket, S3 answers 403 instead of 404 for a missing key
+        self.list_bucket_allowed = True
+        self.page_size = 1000
+        self.head_errors = {}
+
+    def _record(self, name, **kwargs):
+        with self._lock:
+            self.calls.append((name, kwargs))
+
+    def count(self, name):
+        return sum(1 for call, _ in self.calls if call == name)
+
+    def _path(self, bucket, key):
+        path = self.root / bucket / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        self._record("put_object", Bucket=Bucket, Key=Key, size=len(data))
+        self._path(Bucket, Key).write_bytes(data)
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._record("create_multipart_upload", Bucket=Bucket, Key=Key)
+        upload_id = uuid.uuid4().hex
+        self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        self._record("upload_part", Bucket=Bucket, Key=Key, size=len(data))
+        part = self.root / ".uploads" / UploadId / str(PartNumber)
+        part.parent.mkdir(parents=True, exist_ok=True)
+        part.write_bytes(data)
+        self._uploads[UploadId][PartNumber] = part
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._record("complete_multipart_upload", Bucket=Bucket, Key=Key)
+        parts = self._uploads.pop(UploadId)
+        with open(self._path(Bucket, Key), "wb") as target:
+            for entry in MultipartUpload["Parts"]:
+                with open(parts[entry["PartNumber"]], "rb") as source:
+                    while chunk := source.read(1024 * 1024):
+                        target.write(chunk)
+        return {"Key": Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._record("abort_multipart_upload", Bucket=Bucket, Key=Key)
+        self._uploads.pop(UploadId, None)
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        from botocore.exceptions import ClientError
+
+        self._record("head_object", Bucket=Bucket, Key=Key)
+        if Key in self.head_errors:
+            raise ClientError({"Error": {"Code": self.head_errors[Key], "Message": "Error"}}, "HeadObject")
+        path = self.root / Bucket / Key
+        if not path.is_file():
+            if not self.list_bucket_allowed:
+                raise ClientError({"Error": {"Code": "403", "Message": "Forbidden"}}, "HeadObject")
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": path.stat().st_size}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, **kwargs):
+        from botocore.exceptions import ClientError
+
+        self._record("list_objects_v2", Bucket=Bucket, Prefix=Prefix)
+        if not self.list_bucket_allowed:
+            raise ClientError({"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, "ListObjectsV2")
+        bucket = self.root / Bucket
+        directory = bucket / Prefix.rpartition("/")[0]
+        keys = sorted(
+            key for key in (path.relative_to(bucket).as_posix() for path in directory.rglob("*") if path.is_file())
+            if key.startswith(Prefix)
+        ) if directory.is_dir() else []
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + self.page_size]
+        response = {
+            "Contents": [{"Key": key, "Size": (bucket / key).stat().st_size} for key in page],
+            "IsTruncated": start + self.page_size < len(keys),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + self.page_size)
+        return response
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._record("get_object", Bucket=Bucket, Key=Key)
+        path = self.root / Bucket / Key
+        if not path.is_file():
+            raise self.exceptions.NoSuchKey(Key)
+        return {"Body": io.BytesIO(path.read_bytes()), "ContentLength": path.stat().st_size}
+
+    def read(self, Bucket, Key):
+        return (self.root / Bucket / Key).read_bytes()
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kwargs):
+        self._record("generate_presigned_url", **Params)
+        signature = hashlib.sha256(f"{Params['Key']}:{ExpiresIn}:{time.time()}".encode()).hexdigest()
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?X-Amz-Expires={ExpiresIn}&X-Amz-Signature={signature}"
+
+
+class SlowS3(FakeS3):
+    """FakeS3 with ``latency`` seconds of sleep per call, to approximate the network round trip."""
+
+    def __init__(self, root, latency):
+        super().__init__(root)
+        self.latency = latency
+
+    def _record(self, name, **kwargs):
+        time.sleep(self.latency)
+        super()._record(name, **kwargs)
@@ -0,0 +1,106 @@
+from sqlalchemy import event
+
+from app.crud import crud_application, crud_summary
+from app.models import models
+from app.schemas import schemas
+
+
+def summary_rows(db):
+    # Incremental updates leave emptied (scholarship, status) rows at zero; a rebuild doesn't create them
+    table = models.ScholarshipSummary.__table__
+    return sorted(tuple(row) for row in db.execute(table.select().where(table.c.application_count > 0)).all())
+
+
+def new_application(user_id, scholarship_id=1):
+    return schemas.ApplicationBase(id=0, scholarship_id=scholarship_id, user_id=user_id, name=user_id)
+
+
+def test_incremental_summary_matches_a_rebuild(db):
+    ids = [crud_application.create_application(db, new_application(f"u{i}")).id for i in range(4)]
+    ids.append(crud_application.create_application_with_documents(db, new_application("u4"), [("CV", crud_application.StoredFile("cv.pdf", None, None))]).id)
+    crud_application.create_application(db, new_application("other", scholarship_id=2))
+    crud_application.bulk_update_status(db, 1, schemas.ApplicationStatus.submitted, schemas.ApplicationStatus.under_evaluation)
+    results = [
+        {"id": ids[0], "status": schemas.ApplicationStatus.approved, "select": True, "grade": 18.0, "reason": "Best"},
+        {"id": ids[1], "status": schemas.ApplicationStatus.rejected, "select": False, "grade": 12.0, "reason": "Low"},
+        {"id": ids[2], "status": schemas.ApplicationStatus.rejected, "select": False, "grade": 9.5, "reason": "Low"},
+    ]
+    crud_application.apply_grading_results(db, results)
+    # Applying the same results again changes nothing
+    crud_application.apply_grading_results(db, results)
+    crud_application.update_application_status(db, ids[3], schemas.ApplicationStatus.rejected, grade=11.0)
+    crud_application.update_application_select(db, ids[1], True)
+
+    incremental = summary_rows(db)
+    crud_summary.rebuild_summaries(db)
+    assert summary_rows(db) == incremental
+
+    summary = crud_summary.get_summary(db, 1)
+    assert summary["total"] == 5
+    assert summary["by_status"][models.ApplicationStatus.rejected] == 3
+    assert summary["by_status"][models.ApplicationStatus.under_evaluation] == 1
+    assert summary["selected"] == 2
+    assert summary["graded"] == 4
+    assert summary["mean"] == (18.0 + 12.0 + 9.5 + 11.0) / 4
+
+
+def test_aggregates_endpoint(db, api_client):
+    ids = [crud_application.create_application(db, new_application(f"u{i}")).id for i in range(6)]
+    grades = [15.0, 10.0, 18.0, 12.0, 8.0]
+    crud_application.apply_grading_results(db, [
+        {"id": i, "status": schemas.ApplicationStatus.approved if g == 18.0 else schemas.ApplicationStatus.rejected,
+         "select": g == 18.0, "grade": g, "reason": ""}
+        for i, g in zip(ids, grades)
+    ])
+
+    body = api_client.get("/applications/scholarship/1/aggregates", params={"top": 3}).json()
+
+    assert body["total"] == 6
+    assert body["by_status"] == {"Submitted": 1, "Under Evaluation": 0, "Approved": 1, "Rejected": 4}
+    assert body["selected"] == 1
+    assert body["grades"]["count"] == 5
+    assert (body["grades"]["min"], body["grades"]["max"], body["grades"]["mean"]) == (8.0, 18.0, 12.6)
+    assert body["grades"]["percentiles"] == {"p25": 10.0, "p50": 12.0, "p75": 15.0, "p90": 18.0}
+    assert [(r["rank"], r["id"], r["grade"]) for r in body["ranking"]] == [(1, ids[2], 18.0), (2, ids[0], 15.0), (3, ids[3], 12.0)]
+
+    empty = api_client.get("/applications/scholarship/99/aggregates").json()
+    assert empty["total"] == 0 and empty["grades"] == {"count": 0, "mean": None, "min": None, "max": None, "percentiles": {}}
+    assert empty["ranking"] == []
+
+
+def test_summary_before_reads_lock_the_rows(db, engine):
+    ids = [crud_application.create_application(db, new_application(f"lock-{i}")).id for i in range(2)]
+    locked = []
+    listener = lambda conn, clause, *args: locked.append(getattr(clause, "_for_update_arg", None) is not None)
+    event.listen(engine, "before_execute", listener)
+    try:
+        crud_application.update_application_status(db, ids[0], schemas.ApplicationStatus.under_evaluation)
+        crud_application.update_application_select(db, ids[0], True)
+        crud_application.apply_grading_results(db, [
+            {"id": ids[1], "status": schemas.ApplicationStatus.approved, "select": True, "grade": 15.0, "reason": ""},
+        ])
+    finally:
+        event.remove(engine, "before_execute", listener)
+    # One locked read of the current values per change
+    assert locked.count(True) == 3
+
+
+def test_summary_recovers_from_applications_written_outside_crud(db):
+    # Inserted directly, so the summary table knows nothing about it
+    application = models.Application(scholarship_id=3, user_id="u", name="u")
+    db.add(application)
+    db.commit()
+    assert crud_summary.backfill_if_empty(db) == 1
+    assert crud_summary.backfill_if_empty(db) == 0
+
+    other = models.Application(scholarship_id=3, user_id="v", name="v")
+    db.add(other)
+    db.commit()
+    crud_application.update_application_status(db, other.id, schemas.ApplicationStatus.rejected, grade=10.0)
+    crud_application.update_application_status(db, application.id, schemas.ApplicationStatus.approved, grade=14.0)
+    crud_application.update_application_status(db, application.id, schemas.ApplicationStatus.rejected, grade=14.0)
+
+    summary = crud_summary.get_summary(db, 3)
+    assert (summary["total"], summary["graded"], summary["mean"]) == (2, 2, 12.0)
+    assert summary["by_status"][models.ApplicationStatus.submitted] == 0
+    assert summary["by_status"][models.ApplicationStatus.rejected] == 2
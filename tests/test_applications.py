@@ -1,4 +1,380 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List
+
 from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
 from app.main import app
+from app.models import models
+from app.consumers import handlers
+from app.consumers.outbox import OutboxRelay
+from app.consumers.producer import decode_chunk
+from app.schemas import schemas
+from app.crud import crud_application
+from app.core import serialization
+from app.routers.application import presign_documents
+from tests.fakes import GRADING_QUEUE_URL, seed_applications
+
+client = TestClient(app)
+
+
+def test_bulk_update_status_only_moves_matching_rows(db):
+    ids = seed_applications(db, scholarship_id=1, count=3)
+    seed_applications(db, scholarship_id=2, count=2)
+    db.query(models.Application).filter(models.Application.id == ids[0]).update({"status": models.ApplicationStatus.rejected})
+    db.commit()
+
+    rows = crud_application.bulk_update_status(
+        db, 1, schemas.ApplicationStatus.submitted, schemas.ApplicationStatus.under_evaluation
+    )
+
+    assert sorted(row["id"] for row in rows) == ids[1:]
+    assert all(row["status"] == models.ApplicationStatus.under_evaluation for row in rows)
+    statuses = {a.id: a.status for a in db.query(models.Application).filter(models.Application.scholarship_id == 1)}
+    assert statuses[ids[0]] == models.ApplicationStatus.rejected
+    untouched = db.query(models.Application).filter(models.Application.scholarship_id == 2).all()
+    assert all(a.status == models.ApplicationStatus.submitted for a in untouched)
+
+
+def test_process_message_sends_grading_payload(db, session_factory, fake_s3, fake_sqs, monkeypatch):
+    ids = seed_applications(db, scholarship_id=7, count=3, documents_per_application=2)
+    monkeypatch.setattr(handlers, "WorkerSessionLocal", session_factory)
+    monkeypatch.setattr(handlers.settings, "TO_GRADING_QUEUE_URL", GRADING_QUEUE_URL)
+
+    body = {"scholarship_id": 7, "jury_ids": ["j1"], "spots": 1, "closed_at": "2024-01-01T00:00:00"}
+    handlers.process_message({"Body": json.dumps(body)})
+    # Nothing is sent until the outbox relay runs
+    assert not fake_sqs.pending(GRADING_QUEUE_URL)
+    assert OutboxRelay(session_factory, fake_sqs).run_once() == 1
+
+    messages = fake_sqs.receive_message(GRADING_QUEUE_URL, MaxNumberOfMessages=10)["Messages"]
+    assert len(messages) == 1
+    payload = decode_chunk(messages[0])
+    assert payload["scholarship_id"] == 7
+    assert payload["manifest"]["chunk_total"] == 1
+    assert sorted(a["id"] for a in payload["applications"]) == ids
+    assert all(len(a["documents"]) == 2 and "status" not in a for a in payload["applications"])
+    assert all(d["file_path"].startswith("https://") for a in payload["applications"] for d in a["documents"])
+
+    db.expire_all()
+    assert all(a.status == models.ApplicationStatus.under_evaluation for a in db.query(models.Application))
+
+
+def test_process_message2_applies_results_in_one_transaction(db, session_factory, monkeypatch):
+    ids = seed_applications(db, scholarship_id=3, count=3, status=models.ApplicationStatus.under_evaluation)
+    monkeypatch.setattr(handlers, "WorkerSessionLocal", session_factory)
+    body = {"applications": [
+        {"application_id": ids[0], "status": "Accepted", "grade": 18.5, "reason": "Best"},
+        {"application_id": ids[1], "status": "Rejected", "grade": 12.0, "reason": "Low grade"},
+        {"application_id": ids[2], "status": "Rejected", "grade": 9.0, "reason": "Missing documents"},
+    ]}
+    message = {"Body": json.dumps(body)}
+
+    # Delivering the same message twice ends in the same state
+    handlers.process_message2(message)
+    handlers.process_message2(message)
+
+    db.expire_all()
+    applications = {a.id: a for a in db.query(models.Application)}
+    assert applications[ids[0]].status == models.ApplicationStatus.approved
+    assert applications[ids[0]].select is True
+    assert applications[ids[0]].grade == 18.5
+    assert applications[ids[1]].status == models.ApplicationStatus.rejected
+    assert applications[ids[1]].select is False
+    assert applications[ids[2]].reason == "Missing documents"
+
+
+def test_read_endpoints(db, api_client, fake_s3):
+    ids = seed_applications(db, scholarship_id=4, count=2, documents_per_application=2)
+
+    listing = api_client.get("/applications/", params={"user_id": "user-0"})
+    assert listing.status_code == 200
+    assert [a["id"] for a in listing.json()] == [ids[0]]
+    assert len(listing.json()[0]["documents"]) == 2
+    assert listing.json()[0]["documents"][0]["file_path"].split("?")[0].endswith(f"/key-{ids[0]}-0")
+
+    details = api_client.get(f"/applications/{ids[1]}/details")
+    assert details.json()["user_id"] == "user-1"
+
+    by_scholarship = api_client.get("/applications/scholarship/4")
+    assert sorted(a["id"] for a in by_scholarship.json()) == ids
+
+
+def test_listing_records_serialize_like_application_base(db, fake_s3):
+    ids = seed_applications(db, scholarship_id=13, count=3, documents_per_application=2)
+    db.query(models.Application).filter(models.Application.id == ids[0]).update({
+        "status": models.ApplicationStatus.approved, "grade": 17.5, "select": True, "user_response": models.UserResponse.accept,
+    })
+    db.query(models.Application).filter(models.Application.id == ids[1]).update({"created_at": datetime(2024, 5, 1, 12, 30, 15)})
+    db.commit()
+
+    applications = (
+        db.query(models.Application).filter(models.Application.scholarship_id == 13)
+        .order_by(models.Application.created_at, models.Application.id).all()
+    )
+    records, _ = crud_application.list_application_records(db, 10, scholarship_id=13)
+    adapter = TypeAdapter(List[schemas.ApplicationBase])
+    expected = adapter.dump_json(adapter.validate_python(applications, from_attributes=True))
+    assert json.loads(serialization.dumps([presign_documents(record) for record in records])) == json.loads(expected)
+
+    aware = {"created_at": datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)}
+    assert serialization.dumps(aware) == TypeAdapter(Dict[str, datetime]).dump_json(aware)
+
+
+def test_async_read_functions_match_sync(tmp_path):
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_engine(url)
+    SQLModel.metadata.create_all(sync_engine)
+    with sessionmaker(bind=sync_engine)() as db:
+        ids = seed_applications(db, scholarship_id=5, count=3, documents_per_application=1)
+        expected_records, _ = crud_application.list_application_records(db, scholarship_id=5)
+        expected_listing, _ = crud_application.list_application_records(db, user_id="user-1")
+
+    async def run():
+        engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                listing, _ = await crud_application.list_application_records_async(db, user_id="user-1")
+                single = await crud_application.get_application_async(db, ids[2])
+                records, _ = await crud_application.list_application_records_async(db, scholarship_id=5)
+                return listing, single, records
+        finally:
+            await engine.dispose()
+
+    listing, single, records = asyncio.run(run())
+    assert records == expected_records
+    assert listing == expected_listing and [a["id"] for a in listing] == [ids[1]]
+    assert single.documents[0].file_path == f"key-{ids[2]}-0"
+
+
+def test_submit_streams_documents_and_commits_once(db, api_client, fake_s3, monkeypatch):
+    monkeypatch.setattr(crud_application.settings, "S3_UPLOAD_PART_SIZE", crud_application.S3_MIN_PART_SIZE)
+    big = os.urandom(crud_application.S3_MIN_PART_SIZE * 2 + 123)
+    response = api_client.post(
+        "/applications/submit",
+        data={"scholarship_id": 9, "user_id": "user-9", "name": "Applicant 9"},
+        files=[
+            ("document_file", ("CV.pdf", b"small file", "application/pdf")),
+            ("document_file", ("Portfolio.zip", big, "application/zip")),
+        ],
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert sorted(d["name"] for d in body["documents"]) == ["CV", "Portfolio"]
+
+    bucket = crud_application.settings.S3_BUCKET_NAME
+    cv_key = f"documents/9/user-9/{hashlib.sha256(b'small file').hexdigest()}.pdf"
+    portfolio_key = f"documents/9/user-9/{hashlib.sha256(big).hexdigest()}.zip"
+    assert fake_s3.read(bucket, cv_key) == b"small file"
+    assert fake_s3.read(bucket, portfolio_key) == big
+    assert fake_s3.count("upload_part") == 3
+    assert max(kwargs["size"] for name, kwargs in fake_s3.calls if name == "upload_part") <= crud_application.S3_MIN_PART_SIZE
+
+    stored = db.query(models.Application).filter(models.Application.id == body["id"]).one()
+    assert {(d.file_path, d.sha256, d.size) for d in stored.documents} == {
+        (cv_key, hashlib.sha256(b"small file").hexdigest(), 10), (portfolio_key, hashlib.sha256(big).hexdigest(), len(big)),
+    }
+
+
+def test_submit_deduplicates_documents_by_content(db, api_client, fake_s3):
+    def submit(user_id, content):
+        response = api_client.post(
+            "/applications/submit",
+            data={"scholarship_id": 10, "user_id": user_id, "name": user_id},
+            files=[("document_file", ("CV.pdf", content, "application/pdf"))],
+        )
+        assert response.status_code == 200, response.text
+        return db.query(models.DocumentTemplate).filter(models.DocumentTemplate.application_id == response.json()["id"]).one()
+
+    first = submit("user-a", b"cv of a")
+    # Same file name from another applicant: its own object, nothing overwritten
+    other = submit("user-b", b"cv of b")
+    assert first.file_path != other.file_path
+    assert fake_s3.read(crud_application.settings.S3_BUCKET_NAME, first.file_path) == b"cv of a"
+    assert fake_s3.count("put_object") == 2
+
+    # Resubmitting the same bytes finds the object with a HEAD and skips the upload
+    again = submit("user-a", b"cv of a")
+    assert again.file_path == first.file_path
+    assert fake_s3.count("put_object") == 2
+    assert fake_s3.count("head_object") == 3
+
+def test_bulk_submit_creates_valid_items_in_one_insert(db, engine, api_client, fake_s3):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    bucket = str(crud_application.settings.S3_BUCKET_NAME)
+    keys = [f"documents/11/partner-{i}/cv.pdf" for i in range(50)]
+    for i, key in enumerate(keys):
+        fake_s3.put_object(Bucket=bucket, Key=key, Body=b"cv" * (i + 1))
+    items = [
+        {"scholarship_id": 11, "user_id": f"partner-{i}", "name": f"Applicant {i}", "documents": [{"name": "CV", "key": keys[i], "size": 1}]}
+        for i in range(50)
+    ]
+    items[3] = {"scholarship_id": "eleven", "user_id": "partner-3", "name": "Applicant 3"}
+    items[7]["documents"] = [{"name": "CV"}]
+    # Another applicant's document, one outside the namespace, and one that was never uploaded
+    items[20]["documents"][0]["key"] = keys[21]
+    items[21]["documents"][0]["key"] = "documents/11/partner-21/../partner-22/cv.pdf"
+    items[22]["documents"][0]["key"] = "documents/11/partner-22/missing.pdf"
+
+    response = api_client.post("/applications/submit/bulk", json={"applications": items})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["created"], body["failed"]) == (45, 5)
+    assert [r["index"] for r in body["results"]] == list(range(50))
+    assert body["results"][3]["id"] is None and body["results"][3]["errors"][0].startswith("scholarship_id")
+    assert body["results"][7]["errors"] == ["documents.0: exactly one of key and file is required"]
+    assert body["results"][20]["errors"] == ["documents.0: key must start with 'documents/11/partner-20/'"]
+    assert body["results"][21]["errors"] == ["documents.0: key must start with 'documents/11/partner-21/'"]
+    assert body["results"][22]["errors"] == ["documents.0: no document at 'documents/11/partner-22/missing.pdf'"]
+    assert sum(1 for statement in statements if statement.startswith("INSERT INTO application ")) == 1
+    # One listing per applicant namespace instead of a HEAD per key
+    assert (fake_s3.count("list_objects_v2"), fake_s3.count("head_object")) == (46, 0)
+
+    created = {r["id"]: r["index"] for r in body["results"] if r["id"] is not None}
+    stored = db.query(models.Application).filter(models.Application.scholarship_id == 11).all()
+    assert {a.id: a.user_id for a in stored} == {i: f"partner-{index}" for i, index in created.items()}
+    # The size comes from S3, not from the caller
+    assert all(
+        [(d.file_path, d.size) for d in a.documents] == [(keys[created[a.id]], 2 * (created[a.id] + 1))] for a in stored
+    )
+
+    too_many = [items[0]] * (crud_application.settings.BULK_SUBMIT_MAX_ITEMS + 1)
+    assert api_client.post("/applications/submit/bulk", json={"applications": too_many}).status_code == 413
+
+
+def test_bulk_submit_lists_each_namespace_once(db, api_client, fake_s3):
+    fake_s3.page_size = 2
+    bucket = str(crud_application.settings.S3_BUCKET_NAME)
+    keys = [f"documents/13/user-13/{i}.pdf" for i in range(5)]
+    for i, key in enumerate(keys):
+        fake_s3.put_object(Bucket=bucket, Key=key, Body=b"x" * i)
+    fake_s3.put_object(Bucket=bucket, Key="documents/13/user-130/0.pdf", Body=b"other applicant")
+    items = [
+        {"scholarship_id": 13, "user_id": "user-13", "name": "A", "documents": [{"name": "CV", "key": keys[i]}, {"name": "Letter", "key": keys[4 - i]}]}
+        for i in range(5)
+    ]
+    items.append({"scholarship_id": 13, "user_id": "user-13", "name": "B", "documents": [{"name": "CV", "key": "documents/13/user-13/0.pdf.bak"}]})
+
+    response = api_client.post("/applications/submit/bulk", json={"applications": items})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["created"] == 5
+    assert response.json()["results"][5]["errors"] == ["documents.0: no document at 'documents/13/user-13/0.pdf.bak'"]
+    # Three pages of one namespace, fetched once for all six items
+    assert [kwargs["Prefix"] for name, kwargs in fake_s3.calls if name == "list_objects_v2"] == ["documents/13/user-13/"] * 3
+    sizes = {d.file_path: d.size for d in db.query(models.DocumentTemplate).all()}
+    assert sizes == {key: i for i, key in enumerate(keys)}
+
+
+def test_bulk_submit_multipart_uploads_referenced_files_once(db, api_client, fake_s3):
+    fake_s3.put_object(Bucket=str(crud_application.settings.S3_BUCKET_NAME), Key="documents/12/b/cv.pdf", Body=b"cv of b")
+    manifest = [
+        {"scholarship_id": 12, "user_id": "a", "name": "A", "documents": [{"name": "Letter", "file": "letter.pdf"}]},
+        {"scholarship_id": 12, "user_id": "b", "name": "B", "documents": [{"name": "Letter", "file": "letter.pdf"}, {"name": "CV", "key": "documents/12/b/cv.pdf"}]},
+        {"scholarship_id": 12, "user_id": "c", "name": "C", "documents": [{"name": "CV", "file": "missing.pdf"}]},
+        {"scholarship_id": 12, "user_id": "d", "name": "D", "documents": [{"name": "Letter", "file": "letter.pdf"}, {"name": "CV", "key": "b/cv.pdf"}]},
+    ]
+    response = api_client.post(
+        "/applications/submit/bulk/multipart",
+        data={"applications": json.dumps(manifest)},
+        files=[("files", ("letter.pdf", b"letter", "application/pdf")), ("files", ("unused.pdf", b"unused", "application/pdf"))],
+    )
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 2)
+    assert body["results"][2]["errors"] == ["documents.0: no uploaded file named 'missing.pdf'"]
+    assert body["results"][3]["errors"] == ["documents.1: key must start with 'documents/12/d/'"]
+    # The letter is hashed once and stored in each valid applicant's namespace
+    letter = hashlib.sha256(b"letter").hexdigest()
+    assert fake_s3.count("put_object") == 3
+    documents = db.query(models.DocumentTemplate).order_by(models.DocumentTemplate.id).all()
+    assert [(d.name, d.file_path, d.sha256, d.size) for d in documents] == [
+        ("Letter", f"documents/12/a/{letter}.pdf", letter, 6),
+        ("Letter", f"documents/12/b/{letter}.pdf", letter, 6),
+        ("CV", "documents/12/b/cv.pdf", None, 7),
+    ]
+
+    invalid = api_client.post("/applications/submit/bulk/multipart", data={"applications": "{"})
+    assert invalid.status_code == 400
+
+
+def test_keyset_pagination(db, api_client, fake_s3):
+    ids = seed_applications(db, scholarship_id=6, count=7)
+    db.query(models.Application).filter(models.Application.id.in_(ids[:2])).update(
+        {"status": models.ApplicationStatus.rejected}, synchronize_session=False
+    )
+    db.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = api_client.get("/applications/scholarship/6", params=params)
+        assert response.status_code == 200
+        seen += [a["id"] for a in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == ids
+
+    submitted = api_client.get("/applications/scholarship/6", params={"status": "Submitted", "limit": 10})
+    assert [a["id"] for a in submitted.json()] == ids[2:]
+    assert "X-Next-Cursor" not in submitted.headers
+
+    assert api_client.get("/applications/scholarship/6", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_export_streams_ndjson_and_csv_with_constant_queries(db, engine, api_client, fake_s3):
+    ids = seed_applications(db, scholarship_id=8, count=5, documents_per_application=2)
+    seed_applications(db, scholarship_id=99, count=2)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    response = api_client.get("/applications/scholarship/8/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["id"] for r in records] == ids
+    assert all(len(r["documents"]) == 2 and r["status"] == "Submitted" for r in records)
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 2
+
+    csv_response = api_client.get("/applications/scholarship/8/export", params={"format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(csv_response.text)))
+    assert [int(r["id"]) for r in rows] == ids
+    assert len(json.loads(rows[0]["documents"])) == 2
+
+
+def test_submit_without_list_bucket_permission(db, api_client, fake_s3):
+    # S3 answers 403 for a missing key: the upload still happens, and bulk items get their own errors
+    fake_s3.list_bucket_allowed = False
+    response = api_client.post(
+        "/applications/submit",
+        data={"scholarship_id": 12, "user_id": "user-12", "name": "user-12"},
+        files=[("document_file", ("CV.pdf", b"cv", "application/pdf"))],
+    )
+    assert response.status_code == 200, response.text
+    assert fake_s3.count("put_object") == 1
 
-client = TestClient(app)
\ No newline at end of file
+    fake_s3.head_errors["documents/12/user-12/broken.pdf"] = "500"
+    items = [
+        {"scholarship_id": 12, "user_id": "user-12", "name": "A", "documents": [{"name": "CV", "key": "documents/12/user-12/missing.pdf"}]},
+        {"scholarship_id": 12, "user_id": "user-12", "name": "B", "documents": [{"name": "CV", "key": "documents/12/user-12/broken.pdf"}]},
+    ]
+    response = api_client.post("/applications/submit/bulk", json={"applications": items})
+    assert response.status_code == 200, response.text
+    assert [r["errors"] for r in response.json()["results"]] == [
+        ["documents.0: no document at 'documents/12/user-12/missing.pdf'"],
+        ["documents.0: could not check 'documents/12/user-12/broken.pdf': 500"],
+    ]
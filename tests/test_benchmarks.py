@@ -0,0 +1,20 @@
+import argparse
+
+from benchmarks.suite import add_run_arguments, compare, run_arguments
+
+
+def result(rps, p50, p99, errors=0):
+    return {"requests": 100, "errors": errors, "seconds": 1.0, "rps": rps, "p50_ms": p50, "p99_ms": p99}
+
+
+def test_compare_flags_slower_scenarios():
+    old = {"results": {"details": result(100, 10, 20), "list_user": result(100, 10, 20), "submit": result(10, 50, 90)}}
+    new = {"results": {"details": result(80, 10, 20), "list_user": result(105, 10.5, 21), "submit": result(10, 50, 90, errors=1)}}
+    assert compare(old, new, threshold=0.10) == ["details", "submit"]
+
+
+def test_run_arguments_round_trip():
+    parser = argparse.ArgumentParser()
+    add_run_arguments(parser)
+    args = parser.parse_args(["--applications", "10", "--cache"])
+    assert parser.parse_args(run_arguments(args)) == args
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+from app.core.cache import ApplicationCache, CachedResponse, MemoryBackend, application_cache
+from app.crud import crud_application
+from app.schemas import schemas
+from tests.fakes import seed_applications
+
+
+def test_memory_backend_ttl_and_lru():
+    backend = MemoryBackend(maxsize=2)
+    backend.set("a", b"1", ttl=60)
+    backend.set("b", b"2", ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("b") is None
+    backend.set("c", b"3", ttl=60)
+    backend.set("d", b"4", ttl=60)
+    assert backend.get("a") is None
+    assert backend.get("d") == b"4"
+
+
+def test_listing_keys_change_when_user_is_invalidated():
+    cache = ApplicationCache(MemoryBackend(), ttl=60)
+    key = cache.listing_key("u1", 0, 100, None, None)
+    cache.set(key, CachedResponse(b"[]"))
+    assert cache.get(key).body == b"[]"
+
+    cache.invalidate(user_ids=["u1"])
+    assert cache.listing_key("u1", 0, 100, None, None) != key
+    assert cache.listing_key("u2", 0, 100, None, None).endswith(key.rsplit(":", 1)[1])
+
+
+def test_details_loaded_during_an_invalidation_are_not_served():
+    cache = ApplicationCache(MemoryBackend(), ttl=60)
+    # A load reads the key, the application changes and is invalidated, then the load stores its stale body
+    key = cache.details_key(1)
+    cache.invalidate(application_ids=[1])
+    cache.set(key, CachedResponse(b"stale"))
+    assert cache.details_key(1) != key
+    assert cache.get(cache.details_key(1)) is None
+    assert cache.details_key(2) == "applications:id:2:v0"
+
+
+def test_memory_backend_drops_counters_after_two_ttls():
+    backend = MemoryBackend(ttl=0.05)
+    cache = ApplicationCache(backend, ttl=0.05)
+    stale = cache.details_key(1)
+    cache.invalidate(application_ids=[1, 2])
+    cache.set(stale, CachedResponse(b"stale"))
+    current = cache.details_key(1)
+    cache.set(current, CachedResponse(b"current"))
+    time.sleep(0.11)
+    cache.invalidate(application_ids=[3])
+    # Only the counter bumped within two TTLs is kept, and every entry it guarded has expired
+    assert list(backend._counters) == ["applications:id:3:version"]
+    assert cache.details_key(1) == stale and cache.get(stale) is None
+    cache.invalidate(application_ids=[1])
+    assert cache.details_key(1) not in (stale, current)
+
+
+def test_blocking_backends_are_called_off_the_event_loop(db, api_client, fake_s3, monkeypatch):
+    [application_id] = seed_applications(db, scholarship_id=1, count=1)
+    on_event_loop = []
+
+    class RemoteBackend(MemoryBackend):
+        blocking = True
+
+        def get_counter(self, key):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(True)
+            except RuntimeError:
+                on_event_loop.append(False)
+            return super().get_counter(key)
+
+    monkeypatch.setattr(application_cache, "backend", RemoteBackend())
+    api_client.get("/applications/", params={"user_id": "user-0"})
+    api_client.get(f"/applications/{application_id}/details")
+    assert on_event_loop == [False, False]
+
+
+def test_details_are_cached_and_answer_if_none_match(db, api_client, fake_s3):
+    [application_id] = seed_applications(db, scholarship_id=1, count=1)
+
+    first = api_client.get(f"/applications/{application_id}/details")
+    second = api_client.get(f"/applications/{application_id}/details")
+    assert first.json() == second.json()
+    assert (application_cache.misses, application_cache.hits) == (1, 1)
+
+    not_modified = api_client.get(f"/applications/{application_id}/details", headers={"If-None-Match": first.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    assert api_client.get("/applications/999999/details").status_code == 404
+
+
+def test_status_change_invalidates_details_and_listing(db, api_client, fake_s3):
+    [application_id] = seed_applications(db, scholarship_id=1, count=1)
+    details = api_client.get(f"/applications/{application_id}/details")
+    listing = api_client.get("/applications/", params={"user_id": "user-0"})
+    assert details.json()["status"] == "Submitted"
+
+    crud_application.update_application_status(db, application_id, schemas.ApplicationStatus.under_evaluation)
+
+    changed = api_client.get(f"/applications/{application_id}/details", headers={"If-None-Match": details.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.json()["status"] == "Under Evaluation"
+    relisted = api_client.get("/applications/", params={"user_id": "user-0"}, headers={"If-None-Match": listing.headers["ETag"]})
+    assert relisted.status_code == 200
+    assert relisted.json()[0]["status"] == "Under Evaluation"
+
+
+def test_grading_results_invalidate(db, api_client, fake_s3):
+    [application_id] = seed_applications(db, scholarship_id=1, count=1)
+    api_client.get(f"/applications/{application_id}/details")
+    crud_application.apply_grading_results(db, [{
+        "id": application_id, "status": schemas.ApplicationStatus.approved, "select": True, "grade": 19.0, "reason": "Top",
+    }])
+    assert api_client.get(f"/applications/{application_id}/details").json()["select"] is True
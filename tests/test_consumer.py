@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+
+from app.consumers.consumer import QueueConsumer
+from app.core.config import settings
+from app.worker import build_consumers
+from tests.fakes import FakeSQS, wait_until
+
+QUEUE_URL = "https://sqs.local/000000000000/test-queue"
+
+
+def make_consumer(sqs, handler, **kwargs):
+    kwargs.setdefault("wait_time_seconds", 0.05)
+    return QueueConsumer(sqs, QUEUE_URL, handler, **kwargs)
+
+
+def test_processes_in_batches_and_batch_deletes():
+    sqs = FakeSQS()
+    for i in range(25):
+        sqs.send_message(QUEUE_URL, json.dumps({"n": i}))
+    seen = []
+    consumer = make_consumer(sqs, lambda message: seen.append(json.loads(message["Body"])["n"]), max_workers=4, max_in_flight=10)
+    consumer.start()
+    wait_until(lambda: sqs.pending(QUEUE_URL) == 0)
+    consumer.stop()
+    consumer.join()
+
+    assert sorted(seen) == list(range(25))
+    assert sqs.count("delete_message") == 0
+    assert sqs.count("delete_message_batch") <= 10
+
+
+def test_concurrency_is_bounded():
+    sqs = FakeSQS()
+    for i in range(20):
+        sqs.send_message(QUEUE_URL, "{}")
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def handler(message):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+
+    consumer = make_consumer(sqs, handler, max_workers=3)
+    consumer.start()
+    wait_until(lambda: sqs.pending(QUEUE_URL) == 0)
+    consumer.stop()
+    consumer.join()
+
+    assert peak[0] <= 3
+    # Never asked SQS for more messages than there were free slots
+    assert all(kwargs["MaxNumberOfMessages"] <= 3 for name, kwargs in sqs.calls if name == "receive_message")
+
+
+def test_failed_messages_are_not_deleted():
+    sqs = FakeSQS()
+    sqs.send_message(QUEUE_URL, json.dumps({"ok": True}))
+    sqs.send_message(QUEUE_URL, json.dumps({"ok": False}))
+
+    def handler(message):
+        if not json.loads(message["Body"])["ok"]:
+            raise ValueError("boom")
+
+    consumer = make_consumer(sqs, handler, visibility_timeout=30)
+    consumer.start()
+    wait_until(lambda: consumer.processed + consumer.failed == 2)
+    consumer.stop()
+    consumer.join()
+
+    assert sqs.pending(QUEUE_URL) == 1
+    assert consumer.failed == 1
+
+
+def test_slow_messages_get_visibility_extended_and_stop_waits_for_them():
+    sqs = FakeSQS()
+    sqs.send_message(QUEUE_URL, "{}")
+    started = threading.Event()
+    done = []
+
+    def handler(message):
+        started.set()
+        time.sleep(0.5)
+        done.append(message["MessageId"])
+
+    consumer = make_consumer(sqs, handler, visibility_timeout=0.2)
+    consumer.start()
+    assert started.wait(5)
+    consumer.stop()
+    consumer.join()
+
+    assert done
+    assert sqs.count("change_message_visibility_batch") >= 1
+    assert sqs.pending(QUEUE_URL) == 0
+
+
+def test_build_consumers_passes_max_in_flight(monkeypatch):
+    monkeypatch.setattr(settings, "DEADLINE_QUEUE_URL", QUEUE_URL)
+    monkeypatch.setattr(settings, "SQS_MAX_IN_FLIGHT", 20)
+    consumer = next(c for c in build_consumers(FakeSQS()) if isinstance(c, QueueConsumer))
+    assert (consumer.max_workers, consumer.max_in_flight) == (settings.SQS_WORKER_THREADS, 20)
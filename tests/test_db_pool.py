@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import exc, text
+
+from app.db import session as db_session
+from app.db.session import create_db_engine, engine_options, pool_stats
+
+
+def test_memory_sqlite_keeps_the_default_pool():
+    assert engine_options("sqlite://", 5, 5) == {}
+
+
+def test_postgres_gets_pool_settings_and_statement_timeout(monkeypatch):
+    monkeypatch.setattr(db_session.settings, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    options = engine_options("postgresql://u:p@db/app", 3, 2)
+    assert (options["pool_size"], options["max_overflow"]) == (3, 2)
+    assert options["pool_pre_ping"] is db_session.settings.DB_POOL_PRE_PING
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert options["executemany_mode"] == "values_plus_batch"
+    async_options = engine_options("postgresql+asyncpg://u:p@db/app", 3, 2, is_async=True)
+    assert async_options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+    assert "executemany_mode" not in async_options
+
+
+def test_pool_stats_report_checkouts_overflow_and_timeouts(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_session.settings, "DB_POOL_TIMEOUT", 0.05)
+    monkeypatch.setattr(db_session, "engines", {})
+    monkeypatch.setattr(db_session, "pool_metrics", {})
+    engine = create_db_engine("test", f"sqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=1)
+
+    first, second = engine.connect(), engine.connect()
+    first.execute(text("select 1"))
+    stats = pool_stats()["test"]
+    assert (stats["size"], stats["checked_out"], stats["overflow"], stats["checkouts"]) == (1, 2, 1, 2)
+
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    assert pool_stats()["test"]["timeouts"] == 1
+
+    first.close()
+    second.close()
+    assert pool_stats()["test"]["checked_out"] == 0
+    engine.dispose()
+
+
+def test_health_endpoint_lists_pools(api_client):
+    response = api_client.get("/health/db")
+    assert response.status_code == 200
+    assert "api" in response.json()
+
+
+def test_async_reads_on_file_sqlite_go_through_get_async_db(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlmodel import SQLModel
+
+    from app.main import app
+    from app.models import models
+    from app.routers.application import verify_token
+
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_engine(url)
+    SQLModel.metadata.create_all(sync_engine)
+    with sync_engine.begin() as connection:
+        connection.execute(models.Application.__table__.insert(), [{"user_id": "u", "scholarship_id": 1, "name": "A"}])
+    sync_engine.dispose()
+    # aiosqlite on a file gets a NullPool, which rejects the QueuePool sizing arguments
+    monkeypatch.setattr(db_session, "ASYNC_DATABASE_URL", db_session.to_async_url(url))
+    monkeypatch.setattr(db_session, "async_engine", None)
+    monkeypatch.setattr(db_session, "AsyncSessionLocal", None)
+
+    app.dependency_overrides[verify_token] = lambda: {"sub": "test-user"}
+    app.dependency_overrides[db_session.get_read_db] = db_session.get_async_db
+    try:
+        client = TestClient(app)
+        listing = client.get("/applications/", params={"user_id": "u"})
+        assert listing.status_code == 200 and [a["name"] for a in listing.json()] == ["A"]
+        assert client.get(f"/applications/{listing.json()[0]['id']}/details").status_code == 200
+        assert client.get("/applications/scholarship/1").status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+        if db_session.async_engine is not None:
+            db_session.async_engine.sync_engine.dispose()
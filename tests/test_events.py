@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+
+from app.core.cache import CachedResponse, application_cache
+from app.core.config import settings
+from app.core.events import StatusEventBus, status_bus
+from app.crud import crud_application
+from app.models import models
+from app.routers.application import status_event_stream
+from app.schemas import schemas
+
+
+def new_application(db, user_id, scholarship_id=1):
+    application = models.Application(user_id=user_id, scholarship_id=scholarship_id, name=user_id)
+    db.add(application)
+    db.commit()
+    return application.id
+
+
+def status_change(user_id, application_id=1):
+    return {"application_id": application_id, "user_id": user_id, "scholarship_id": 1, "status": "Approved", "select": True}
+
+
+def test_crud_changes_are_published_on_commit(db):
+    application_id = new_application(db, "events-a")
+    new_application(db, "events-b")
+    since = status_bus.version()
+
+    crud_application.update_application_status(db, application_id, schemas.ApplicationStatus.under_evaluation)
+    crud_application.update_application_select(db, application_id, True)
+    events, version, reset = status_bus.events_since("events-a", since)
+    assert not reset
+    assert [(e["application_id"], e["status"], e["select"]) for e in events] == [
+        (application_id, "Under Evaluation", False), (application_id, "Under Evaluation", True),
+    ]
+    assert status_bus.events_since("events-b", since)[0] == []
+
+    # Nothing is published for a transaction that doesn't commit, or for results that change nothing
+    crud_application.bulk_update_status(db, 1, schemas.ApplicationStatus.submitted, schemas.ApplicationStatus.under_evaluation, commit=False)
+    db.rollback()
+    results = [{"id": application_id, "status": schemas.ApplicationStatus.approved, "select": True, "grade": 17.0, "reason": ""}]
+    crud_application.apply_grading_results(db, results)
+    crud_application.apply_grading_results(db, results)
+    events, _, _ = status_bus.events_since("events-a", version)
+    assert [e["status"] for e in events] == ["Approved"]
+    assert status_bus.events_since("events-b", since)[0] == []
+
+
+def test_cache_is_invalidated_before_events_are_published(db, monkeypatch):
+    application_id = new_application(db, "events-cache")
+    listing = application_cache.listing_key("events-cache")
+    details = application_cache.details_key(application_id)
+    application_cache.set(listing, CachedResponse(b"[]"))
+    application_cache.set(details, CachedResponse(b"{}"))
+    seen = []
+    publish = status_bus.publish
+    monkeypatch.setattr(status_bus, "publish", lambda e: seen.append(
+        (application_cache.listing_key("events-cache"), application_cache.details_key(application_id))
+    ) or publish(e))
+
+    crud_application.update_application_status(db, application_id, schemas.ApplicationStatus.under_evaluation)
+
+    # A client refetching on the event misses the cache: new listing and details versions
+    assert len(seen) == 1 and seen[0][0] != listing and seen[0][1] != details
+
+
+def test_versions_that_cannot_be_resumed_ask_for_a_reset():
+    bus = StatusEventBus(history=2)
+    since = bus.version()
+    for i in range(3):
+        bus.publish(status_change("u", i))
+    assert bus.events_since("u", since) == ([], bus.version(), True)
+    assert bus.events_since("u", "otherepoch:1")[2]
+    assert bus.events_since("u", "garbage")[2]
+    assert [e["application_id"] for e in bus.events_since("u", f"{bus.epoch}:1")[0]] == [1, 2]
+
+
+def test_long_poll_wakes_on_publish_from_another_thread():
+    bus = StatusEventBus()
+
+    async def run():
+        since = bus.version()
+        waiting = asyncio.create_task(bus.wait("u", since, timeout=5))
+        await asyncio.sleep(0.05)
+        threading.Thread(target=bus.publish, args=(status_change("someone-else"),)).start()
+        threading.Thread(target=bus.publish, args=(status_change("u"),)).start()
+        start = time.monotonic()
+        events, version, reset = await waiting
+        return events, version, reset, time.monotonic() - start
+
+    events, version, reset, waited = asyncio.run(run())
+    assert [e["user_id"] for e in events] == ["u"] and not reset
+    assert version == bus.version()
+    assert waited < 1
+    # Nothing happening: returns empty after the timeout
+    assert asyncio.run(bus.wait("u", version, timeout=0.05)) == ([], version, False)
+
+
+def test_long_poll_endpoint(db, api_client):
+    application_id = new_application(db, "events-poll")
+    first = api_client.get("/applications/events", params={"user_id": "events-poll"}).json()
+    assert first["events"] == [] and not first["reset"]
+
+    crud_application.update_application_status(db, application_id, schemas.ApplicationStatus.rejected, grade=8.0)
+    body = api_client.get("/applications/events", params={"user_id": "events-poll", "since": first["version"]}).json()
+    assert [(e["application_id"], e["status"]) for e in body["events"]] == [(application_id, "Rejected")]
+
+    idle = api_client.get("/applications/events", params={"user_id": "events-poll", "since": body["version"], "timeout": 0}).json()
+    assert idle == {"version": body["version"], "reset": False, "events": []}
+    assert api_client.get("/applications/events", params={"user_id": "events-poll", "since": "stale:3"}).json()["reset"]
+
+
+def test_server_sent_events_stream(monkeypatch):
+    monkeypatch.setattr(settings, "STATUS_EVENTS_KEEPALIVE", 0.01)
+
+    class Request:
+        polls = 0
+
+        async def is_disconnected(self):
+            self.polls += 1
+            return self.polls > 2
+
+    since = status_bus.version()
+    status_bus.publish(status_change("events-sse", 42))
+
+    async def collect():
+        return [message async for message in status_event_stream(Request(), "events-sse", since)]
+
+    messages = asyncio.run(collect())
+    assert messages[0].startswith(f"id: {status_bus.version()}\nevent: status\ndata: ")
+    assert '"application_id":42' in messages[0]
+    assert messages[1:] == [": keepalive\n\n"]
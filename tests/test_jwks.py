@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from app.core.jwks import JWKSKeyStore, TokenClaimsCache
+
+
+def make_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+    return private_key, jwk
+
+
+def write_jwks(path, *jwks):
+    path.write_text(json.dumps({"keys": list(jwks)}))
+
+
+@pytest.fixture
+def jwks_file(tmp_path):
+    return tmp_path / "jwks.json"
+
+
+def test_keys_are_fetched_once(jwks_file):
+    private_key, jwk = make_key("k1")
+    write_jwks(jwks_file, jwk)
+    store = JWKSKeyStore(jwks_file.as_uri())
+
+    token = jwt.encode({"sub": "user"}, private_key, algorithm="RS256", headers={"kid": "k1"})
+    for _ in range(20):
+        key = store.get_signing_key_from_jwt(token)
+        assert jwt.decode(token, key.key, algorithms=["RS256"])["sub"] == "user"
+    assert store.fetch_count == 1
+
+
+def test_unknown_kid_refetches_once(jwks_file):
+    _, jwk1 = make_key("k1")
+    _, jwk2 = make_key("k2")
+    write_jwks(jwks_file, jwk1)
+    store = JWKSKeyStore(jwks_file.as_uri(), min_refetch_interval=60)
+    store.get_signing_key("k1")
+
+    # Key rotation: the new kid is picked up with a single refetch
+    write_jwks(jwks_file, jwk2)
+    store._last_attempt -= 120
+    assert store.get_signing_key("k2").key_id == "k2"
+    assert store.fetch_count == 2
+
+    # A bogus kid inside the refetch window does not hit the JWKS endpoint again
+    with pytest.raises(jwt.PyJWKClientError):
+        store.get_signing_key("bogus")
+    assert store.fetch_count == 2
+
+
+def test_concurrent_cold_start_fetches_once(jwks_file):
+    _, jwk = make_key("k1")
+    write_jwks(jwks_file, jwk)
+    store = JWKSKeyStore(jwks_file.as_uri())
+    fetch = store._fetch
+
+    def slow_fetch():
+        time.sleep(0.05)
+        return fetch()
+
+    store._fetch = slow_fetch
+    threads = [threading.Thread(target=store.get_signing_key, args=("k1",)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.fetch_count == 1
+
+
+def test_background_refresh_does_not_block_cached_keys(jwks_file):
+    _, jwk = make_key("k1")
+    write_jwks(jwks_file, jwk)
+    store = JWKSKeyStore(jwks_file.as_uri(), refresh_interval=0)
+    store.get_signing_key("k1")
+    fetch = store._fetch
+    fetching = threading.Event()
+
+    def slow_fetch():
+        fetching.set()
+        time.sleep(1)
+        return fetch()
+
+    store._fetch = slow_fetch
+    # Starts the background refresh, which holds the fetch for a second
+    store.get_signing_key("k1")
+    assert fetching.wait(1)
+    start = time.monotonic()
+    for _ in range(5):
+        assert store.get_signing_key("k1").key_id == "k1"
+    assert time.monotonic() - start < 0.5
+
+
+def test_claims_cache_respects_exp():
+    cache = TokenClaimsCache(ttl=60, maxsize=2)
+    cache.set("a", {"sub": "a", "exp": time.time() - 1})
+    assert cache.get("a") is None
+
+    cache.set("b", {"sub": "b"})
+    cache.set("c", {"sub": "c"})
+    cache.set("d", {"sub": "d"})
+    assert cache.get("b") is None
+    assert cache.get("d") == {"sub": "d"}
@@ -0,0 +1,161 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlmodel import SQLModel
+
+from app.consumers import handlers, ledger, outbox
+from app.consumers.consumer import QueueConsumer
+from app.consumers.outbox import OutboxRelay
+from app.consumers.producer import decode_chunk
+from app.crud import crud_application
+from app.models import models
+from tests.fakes import GRADING_QUEUE_URL, seed_applications, wait_until
+
+DEADLINE_QUEUE_URL = "https://sqs.local/000000000000/deadline"
+DEADLINE = {"scholarship_id": 7, "jury_ids": ["j1"], "spots": 1, "closed_at": "2024-01-01T00:00:00"}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # The consumer runs handlers on several threads: each session gets its own connection, as in
+    # production, rather than the shared in-memory one whose rollbacks would undo other threads' work
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def worker_sessions(session_factory, monkeypatch):
+    monkeypatch.setattr(handlers, "WorkerSessionLocal", session_factory)
+    monkeypatch.setattr(handlers.settings, "TO_GRADING_QUEUE_URL", GRADING_QUEUE_URL)
+
+
+@pytest.fixture
+def bulk_updates(monkeypatch):
+    calls = []
+    bulk_update_status = crud_application.bulk_update_status
+
+    def spy(*args, **kwargs):
+        calls.append(args[1])
+        return bulk_update_status(*args, **kwargs)
+
+    monkeypatch.setattr(crud_application, "bulk_update_status", spy)
+    return calls
+
+
+def drain(sqs, queue_url, handler, rounds=5):
+    """Run a consumer until the queue is empty, expiring visibility timeouts between rounds as a crash would."""
+    for _ in range(rounds):
+        consumer = QueueConsumer(sqs, queue_url, handler, wait_time_seconds=0.05, visibility_timeout=30)
+        consumer.start()
+        wait_until(lambda: consumer.processed + consumer.failed >= 1 or not sqs.pending(queue_url))
+        consumer.stop()
+        consumer.join()
+        if not sqs.pending(queue_url):
+            return
+        sqs.make_visible(queue_url)
+    raise AssertionError("queue not drained")
+
+
+def grading_messages(sqs):
+    messages = sqs.receive_message(GRADING_QUEUE_URL, MaxNumberOfMessages=10).get("Messages", [])
+    return [decode_chunk(message) for message in messages]
+
+
+def test_duplicate_deliveries_send_one_grading_payload(db, session_factory, fake_s3, fake_sqs, worker_sessions, bulk_updates):
+    ids = seed_applications(db, scholarship_id=7, count=3)
+    # The same notification sent twice (overlapping schedulers) and delivered twice
+    fake_sqs.send_message(DEADLINE_QUEUE_URL, json.dumps(DEADLINE))
+    fake_sqs.send_message(DEADLINE_QUEUE_URL, json.dumps(DEADLINE))
+
+    drain(fake_sqs, DEADLINE_QUEUE_URL, handlers.process_message)
+    OutboxRelay(session_factory, fake_sqs).run_once()
+
+    assert bulk_updates == [7]
+    [payload] = grading_messages(fake_sqs)
+    assert sorted(a["id"] for a in payload["applications"]) == ids
+
+
+def test_failed_transaction_leaves_no_claim_and_is_retried(db, session_factory, fake_s3, fake_sqs, worker_sessions, bulk_updates, monkeypatch):
+    ids = seed_applications(db, scholarship_id=7, count=3)
+    enqueue = outbox.enqueue
+    attempts = []
+
+    def crash_once(*args):
+        attempts.append(args)
+        if len(attempts) == 1:
+            raise ConnectionError("injected fault before commit")
+        return enqueue(*args)
+
+    monkeypatch.setattr(outbox, "enqueue", crash_once)
+    fake_sqs.send_message(DEADLINE_QUEUE_URL, json.dumps(DEADLINE))
+
+    drain(fake_sqs, DEADLINE_QUEUE_URL, handlers.process_message)
+    OutboxRelay(session_factory, fake_sqs).run_once()
+
+    # The first attempt's status change and claim were rolled back with it
+    assert bulk_updates == [7, 7] and len(attempts) == 2
+    [payload] = grading_messages(fake_sqs)
+    assert sorted(a["id"] for a in payload["applications"]) == ids
+    db.expire_all()
+    assert db.get(models.ProcessedMessage, ledger.message_key("deadline", json.dumps(DEADLINE))) is not None
+
+
+def test_crash_before_delete_is_skipped_on_redelivery(db, session_factory, fake_s3, fake_sqs, worker_sessions, bulk_updates, monkeypatch):
+    seed_applications(db, scholarship_id=7, count=2)
+    delete = fake_sqs.delete_message_batch
+    failures = []
+
+    def lose_first_delete(QueueUrl, Entries):
+        if not failures:
+            failures.append(Entries)
+            raise ConnectionError("injected fault after processing, before delete")
+        return delete(QueueUrl, Entries)
+
+    monkeypatch.setattr(fake_sqs, "delete_message_batch", lose_first_delete)
+    fake_sqs.send_message(DEADLINE_QUEUE_URL, json.dumps(DEADLINE))
+
+    drain(fake_sqs, DEADLINE_QUEUE_URL, handlers.process_message)
+    OutboxRelay(session_factory, fake_sqs).run_once()
+
+    assert failures and bulk_updates == [7]
+    assert len(grading_messages(fake_sqs)) == 1
+
+
+def test_duplicate_grading_results_are_applied_once(db, worker_sessions, monkeypatch):
+    [application_id] = seed_applications(db, scholarship_id=3, count=1, status=models.ApplicationStatus.under_evaluation)
+    applied = []
+    apply_grading_results = crud_application.apply_grading_results
+    monkeypatch.setattr(
+        crud_application, "apply_grading_results", lambda db, results: applied.append(results) or apply_grading_results(db, results)
+    )
+    body = json.dumps({"applications": [{"application_id": application_id, "status": "Accepted", "grade": 18.0, "reason": "Best"}]})
+
+    handlers.process_message2({"Body": body, "MessageId": "a"})
+    handlers.process_message2({"Body": body, "MessageId": "b"})
+
+    assert len(applied) == 1
+    db.expire_all()
+    assert db.get(models.Application, application_id).status == models.ApplicationStatus.approved
+
+
+def test_relay_purges_expired_ledger_rows(db, session_factory):
+    now = datetime.utcnow()
+    db.add_all([
+        models.ProcessedMessage(key=f"old-{i}", created_at=now - timedelta(days=15)) for i in range(3)
+    ] + [models.ProcessedMessage(key="recent", created_at=now - timedelta(days=13))])
+    db.commit()
+
+    assert ledger.purge(db, retention_days=14, batch_size=2) == 3
+    assert [row.key for row in db.query(models.ProcessedMessage).all()] == ["recent"]
+
+    relay = OutboxRelay(session_factory, retention_days=1, purge_interval=3600)
+    assert relay.purge_ledger() == 1
+    # Not due again until purge_interval has passed
+    db.add(models.ProcessedMessage(key="stale", created_at=now - timedelta(days=2)))
+    db.commit()
+    assert relay.purge_ledger() == 0
+    assert OutboxRelay(session_factory).purge_ledger() == 0
@@ -0,0 +1,55 @@
+import json
+
+from app.consumers.consumer import QueueConsumer
+from app.core.metrics import registry
+from benchmarks.bench_metrics_overhead import OVERHEAD_BUDGET_US, measure_overhead
+from tests.fakes import FakeSQS, seed_applications, wait_until
+
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+
+def test_metrics_endpoint_reports_route_templates(db, api_client, fake_s3):
+    [application_id] = seed_applications(db, scholarship_id=1, count=1)
+    route = "/applications/{application_id}/details"
+    before = sample("http_request_duration_seconds_count", method="GET", route=route, status="200")
+    db_before = sample("db_operation_duration_seconds_count", operation="get_application")
+
+    api_client.get(f"/applications/{application_id}/details")
+
+    assert sample("http_request_duration_seconds_count", method="GET", route=route, status="200") == before + 1
+    assert sample("db_operation_duration_seconds_count", operation="get_application") == db_before + 1
+    body = api_client.get("/metrics").text
+    assert f'route="{route}"' in body
+    assert f"/applications/{application_id}/details" not in body
+    assert "# TYPE db_pool_checked_out gauge" in body
+    assert 'cache_lookups_total{cache="applications",result="miss"}' in body
+
+
+def test_consumer_counts_and_times_messages():
+    queue_url = "https://sqs.local/000000000000/metrics-queue"
+    sqs = FakeSQS()
+    for i in range(3):
+        sqs.send_message(queue_url, json.dumps({"n": i}))
+
+    def handler(message):
+        if json.loads(message["Body"])["n"] == 0:
+            raise ValueError("boom")
+
+    consumer = QueueConsumer(sqs, queue_url, handler, wait_time_seconds=0.05)
+    consumer.start()
+    wait_until(lambda: consumer.processed + consumer.failed == 3)
+    consumer.stop()
+    consumer.join()
+
+    assert sample("sqs_messages_total", queue="metrics-queue", outcome="processed") == 2
+    assert sample("sqs_messages_total", queue="metrics-queue", outcome="failed") == 1
+    assert sample("sqs_messages_total", queue="metrics-queue", outcome="deleted") == 2
+    assert sample("sqs_operation_duration_seconds_count", queue="metrics-queue", operation="process") == 3
+
+
+def test_instrumentation_overhead_is_within_budget():
+    overhead = measure_overhead(5000)
+    assert overhead["decorator_us"] < OVERHEAD_BUDGET_US
+    assert overhead["middleware_us"] < OVERHEAD_BUDGET_US
@@ -0,0 +1,55 @@
+from sqlalchemy import inspect, text
+
+from app.core.config import settings
+from app.db import migrations
+from app.db.migrations import add_missing_columns, create_missing_indexes, migrate_document_keys
+from app.models import models
+
+
+def test_migrate_document_keys(db):
+    application = models.Application(user_id="u", scholarship_id=1, name="A")
+    db.add(application)
+    db.flush()
+    bucket = settings.S3_BUCKET_NAME
+    db.add_all([
+        models.DocumentTemplate(application_id=application.id, name="CV", file_path=f"https://{bucket}.s3.amazonaws.com/CV.pdf?X-Amz-Expires=100000"),
+        models.DocumentTemplate(application_id=application.id, name="ID", file_path="ID.pdf"),
+    ])
+    db.commit()
+
+    assert migrate_document_keys(db, batch_size=1) == 1
+    assert migrate_document_keys(db) == 0
+    db.expire_all()
+    assert sorted(d.file_path for d in db.query(models.DocumentTemplate)) == ["CV.pdf", "ID.pdf"]
+
+
+def test_create_missing_indexes(db, engine):
+    db.execute(text("DROP INDEX ix_application_user_id_created_at_id"))
+    db.commit()
+    assert create_missing_indexes(db) == 1
+    assert create_missing_indexes(db) == 0
+    assert "ix_application_user_id_created_at_id" in {i["name"] for i in inspect(engine).get_indexes("application")}
+
+
+def test_add_missing_columns(db, engine):
+    # documenttemplate as it was before sha256 and size
+    db.execute(text("DROP TABLE documenttemplate"))
+    db.execute(text(
+        "CREATE TABLE documenttemplate (id INTEGER PRIMARY KEY, application_id INTEGER, name VARCHAR NOT NULL, file_path VARCHAR NOT NULL)"
+    ))
+    db.execute(text("INSERT INTO documenttemplate (application_id, name, file_path) VALUES (1, 'CV', 'CV.pdf')"))
+    db.commit()
+
+    assert add_missing_columns(db) == 2
+    assert add_missing_columns(db) == 0
+    assert {"sha256", "size"} <= {c["name"] for c in inspect(engine).get_columns("documenttemplate")}
+    assert db.query(models.DocumentTemplate).one().sha256 is None
+
+
+def test_migrations_run_without_the_statement_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    calls = []
+    monkeypatch.setattr(migrations, "create_engine", lambda url, **options: calls.append((url, options)))
+    migrations.migration_engine("postgresql://u:p@db/app")
+    [(url, options)] = calls
+    assert "connect_args" not in options and options["poolclass"] is migrations.NullPool
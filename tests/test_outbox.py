@@ -0,0 +1,70 @@
+import json
+
+from app.consumers import outbox
+from app.consumers.outbox import OutboxRelay
+from app.models import models
+from tests.fakes import FakeSQS
+
+QUEUE_URL = "https://sqs.local/000000000000/outbox"
+
+
+def enqueue(db, count, queue_url=QUEUE_URL):
+    outbox.enqueue(db, queue_url, [{"MessageBody": json.dumps({"n": i}), "MessageAttributes": {}} for i in range(count)])
+    db.commit()
+
+
+def test_relay_batches_across_queues_and_deletes_sent_rows(db, session_factory):
+    sqs = FakeSQS()
+    enqueue(db, 15)
+    enqueue(db, 3, QUEUE_URL + "-other")
+
+    assert OutboxRelay(session_factory, sqs).run_once() == 18
+
+    assert sqs.pending(QUEUE_URL) == 15 and sqs.pending(QUEUE_URL + "-other") == 3
+    assert sqs.count("send_message_batch") == 3
+    assert db.query(models.OutboxMessage).count() == 0
+
+
+def test_failed_sends_back_off_exponentially(db, session_factory, monkeypatch):
+    sqs = FakeSQS()
+    monkeypatch.setattr(outbox.settings, "OUTBOX_BACKOFF_BASE", 10)
+    clock = [1000.0]
+    monkeypatch.setattr(outbox.time, "time", lambda: clock[0])
+    send = sqs.send_message_batch
+    outage = [True]
+
+    def flaky(QueueUrl, Entries):
+        if outage[0]:
+            raise ConnectionError("injected SQS outage")
+        return send(QueueUrl, Entries)
+
+    monkeypatch.setattr(sqs, "send_message_batch", flaky)
+    enqueue(db, 2)
+    relay = OutboxRelay(session_factory, sqs)
+
+    assert relay.run_once() == 0
+    assert relay.run_once() == 0  # not due yet
+    clock[0] += 10
+    assert relay.run_once() == 0
+    db.expire_all()
+    assert {(row.attempts, row.available_at) for row in db.query(models.OutboxMessage)} == {(2, 1030.0)}
+
+    outage[0] = False
+    clock[0] += 20
+    assert relay.run_once() == 2
+    assert sqs.pending(QUEUE_URL) == 2
+
+
+def test_fifo_attributes_survive_the_outbox(db, session_factory):
+    sqs = FakeSQS()
+    outbox.enqueue(db, QUEUE_URL + ".fifo", [{
+        "MessageBody": "{}",
+        "MessageAttributes": {"content-encoding": {"DataType": "String", "StringValue": "gzip+base64"}},
+        "MessageGroupId": "7",
+        "MessageDeduplicationId": "d1-0",
+    }])
+    db.commit()
+    OutboxRelay(session_factory, sqs).run_once()
+
+    [message] = sqs.receive_message(QUEUE_URL + ".fifo")["Messages"]
+    assert message["MessageAttributes"]["content-encoding"]["StringValue"] == "gzip+base64"
@@ -0,0 +1,22 @@
+from app.core.config import settings
+from app.core.presign import PresignedUrlCache, key_from_file_path
+
+
+def test_key_from_file_path():
+    bucket = settings.S3_BUCKET_NAME
+    assert key_from_file_path("CV.pdf") == "CV.pdf"
+    assert key_from_file_path(f"https://{bucket}.s3.amazonaws.com/My%20CV.pdf?X-Amz-Expires=100000") == "My CV.pdf"
+    assert key_from_file_path(f"https://s3.eu-west-1.amazonaws.com/{bucket}/a/b.pdf?X-Amz-Signature=x") == "a/b.pdf"
+
+
+def test_cache_signs_each_key_once_per_bucket(fake_s3):
+    cache = PresignedUrlCache(maxsize=10)
+    first = [cache.get(f"key-{i}", 3600) for i in range(5)]
+    second = [cache.get(f"key-{i}", 3600) for i in range(5)]
+    assert first == second
+    assert fake_s3.count("generate_presigned_url") == 5
+    assert (cache.hits, cache.misses) == (5, 5)
+
+    # A different TTL is a different URL
+    cache.get("key-0", 60)
+    assert fake_s3.count("generate_presigned_url") == 6
@@ -0,0 +1,86 @@
+import json
+import os
+
+from app.consumers import outbox
+from app.consumers.outbox import OutboxRelay
+from app.consumers.producer import SQS_MAX_MESSAGE_BYTES, build_grading_entries, decode_chunk
+
+QUEUE_URL = "https://sqs.local/000000000000/to-grading"
+HEADER = {"scholarship_id": 1, "jury_ids": ["j1", "j2"], "spots": 3, "closed_at": "2024-06-01T00:00:00"}
+
+
+def application(i, documents=3):
+    return {
+        "id": i,
+        "user_id": f"user-{i}",
+        "name": f"Applicant {i}",
+        "documents": [{"id": i * 10 + j, "name": f"doc-{j}", "file_path": f"https://bucket.s3.local/{i}/{j}.pdf?sig=abc"} for j in range(documents)],
+    }
+
+
+def dispatch(db, session_factory, sqs, applications, queue_url=QUEUE_URL):
+    # As apply_deadline does: encode the chunks into the outbox, then a relay sends them
+    entries = build_grading_entries(HEADER, applications, queue_url, "dispatch-1")
+    outbox.enqueue(db, queue_url, entries)
+    db.commit()
+    OutboxRelay(session_factory, sqs, batch_size=len(entries)).run_once()
+    return len(entries)
+
+
+def drain(sqs):
+    messages = []
+    while True:
+        batch = sqs.receive_message(QUEUE_URL, MaxNumberOfMessages=10).get("Messages", [])
+        if not batch:
+            return messages
+        messages += batch
+
+
+def test_large_scholarship_is_split_into_sequenced_chunks(db, session_factory, fake_sqs):
+    applications = [application(i) for i in range(10000)]
+    chunks = dispatch(db, session_factory, fake_sqs, iter(applications))
+
+    messages = drain(fake_sqs)
+    assert len(messages) == chunks > 1
+    assert all(len(m["Body"].encode()) < SQS_MAX_MESSAGE_BYTES for m in messages)
+    assert fake_sqs.count("send_message") == 0
+    assert fake_sqs.count("send_message_batch") <= chunks // 10 + 2
+
+    payloads = sorted((decode_chunk(m) for m in messages), key=lambda p: p["manifest"]["chunk_index"])
+    assert [p["manifest"]["chunk_index"] for p in payloads] == list(range(chunks))
+    assert {p["manifest"]["chunk_total"] for p in payloads} == {chunks}
+    assert len({p["manifest"]["dispatch_id"] for p in payloads}) == 1
+    assert all(p["jury_ids"] == HEADER["jury_ids"] for p in payloads)
+    assert [a for p in payloads for a in p["applications"]] == applications
+
+
+def test_oversized_application_is_compressed(db, session_factory, fake_sqs):
+    big = application(1, documents=4000)
+    assert len(json.dumps(big)) > SQS_MAX_MESSAGE_BYTES
+    dispatch(db, session_factory, fake_sqs, [big])
+
+    [message] = drain(fake_sqs)
+    assert message["MessageAttributes"]["content-encoding"]["StringValue"] == "gzip+base64"
+    assert decode_chunk(message)["applications"] == [big]
+
+
+def test_incompressible_payload_goes_to_s3(db, session_factory, fake_sqs, fake_s3):
+    big = {"id": 1, "blob": os.urandom(300 * 1024).hex()}
+    dispatch(db, session_factory, fake_sqs, [big])
+
+    [message] = drain(fake_sqs)
+    assert "payload_location" in json.loads(message["Body"])
+    assert fake_s3.count("put_object") == 1
+    assert decode_chunk(message)["applications"] == [big]
+
+
+def test_empty_scholarship_still_sends_one_chunk(db, session_factory, fake_sqs):
+    assert dispatch(db, session_factory, fake_sqs, []) == 1
+    [message] = drain(fake_sqs)
+    assert decode_chunk(message)["applications"] == []
+
+
+def test_fifo_queue_gets_group_and_deduplication_ids():
+    [entry] = build_grading_entries(HEADER, [application(1)], QUEUE_URL + ".fifo", "d1")
+    assert entry["MessageGroupId"] == "1"
+    assert entry["MessageDeduplicationId"] == "d1-0"
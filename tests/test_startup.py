@@ -0,0 +1,44 @@
+import os
+import re
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Generous so slow CI machines pass; a regression back to import-time AWS clients blows well past it
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", 5))
+
+
+def run_python(code, *flags):
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+
+
+def test_import_has_no_side_effects():
+    result = run_python(
+        "import threading, sys, app.main\n"
+        "from app.core import aws\n"
+        "print(threading.active_count(), 'boto3' in sys.modules, len(aws._clients))"
+    )
+    assert result.stdout.split() == ["1", "False", "0"]
+
+
+def test_import_time_budget():
+    result = run_python("import app.main", "-X", "importtime")
+    match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| app\.main$", result.stderr, re.MULTILINE)
+    assert match, result.stderr[-2000:]
+    cumulative_seconds = int(match.group(1)) / 1e6
+    print(f"app.main cumulative import time: {cumulative_seconds:.3f}s")
+    assert cumulative_seconds < IMPORT_TIME_BUDGET_SECONDS
+
+
+def test_lifespan_can_skip_consumers(monkeypatch):
+    monkeypatch.setattr(settings, "SQS_CONSUMERS_ENABLED", False)
+    with TestClient(app) as client:
+        assert client.get("/applications/health").json() == {"status": "ok"}